@@ -1,4 +1,8 @@
-from fastapi import FastAPI
+import time
+from typing import Literal
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from db import SessionLocal
 from models import MarketData, MacroData, MarketState, MarketSummary
@@ -8,11 +12,18 @@ from data_fetcher import (
     get_equity_quotes,
     get_macro_data,
     get_market_data,
+    get_metric_history,
 )
-from fastapi.responses import JSONResponse
-from overview_service import build_overview_snapshot
+from fastapi.responses import JSONResponse, Response
+from overview_service import get_overview_snapshot, refresh_overview_snapshot
 from market_state_service import build_market_state
 from llm_summary import generate_summary
+from services.downsampling import lttb
+from services.history_loader import MAX_HISTORY_LIMIT, load_market_history, load_symbol_history
+from services.metric_loader import load_metric_history
+from services.retention_service import run_retention
+from services.single_flight import single_flight
+from services.task_graph import run_task_graph
 from datetime import date
 
 app = FastAPI(
@@ -48,35 +59,111 @@ def market_data():
 
 # --- HISTORICAL MARKET DATA ---
 @app.get("/api/history", tags=["Database"])
-def get_history():
-    """Returns all market data stored in SQLite database."""
-    db: Session = SessionLocal()
-    data = db.query(MarketData).order_by(MarketData.date).all()
-    db.close()
+def get_history(
+    start: date | None = None,
+    end: date | None = None,
+    symbols: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_HISTORY_LIMIT),
+    cursor: date | None = None,
+    format: Literal["rows", "columns"] = "rows",
+):
+    """
+    Returns stored market data, oldest first.
+
+    symbols is a comma-separated list of columns (all by default). With
+    limit, pages are chained by passing the previous X-Next-Cursor header
+    (also next_cursor in columnar mode) as cursor. format=columns returns
+    one array per column instead of one object per date.
+    """
+    selected = [s.strip().lower() for s in symbols.split(",") if s.strip()] if symbols else None
 
-    return [
-        {
-            "date": str(row.date),
-            "sp500": row.sp500,
-            "nasdaq": row.nasdaq,
-            "irx": row.irx,
-            "fvx": row.fvx,
-            "tnx": row.tnx,
-            "gold": row.gold,
-            "oil": row.oil,
-            "copper": row.copper,
-            "usd_index": row.usd_index,
-            "eurusd": row.eurusd,
-            "gbpusd": row.gbpusd,
-            "audusd": row.audusd,
-            "usdjpy": row.usdjpy,
-            "usdchf": row.usdchf,
-            "cew": row.cew,
-            "bitcoin": row.bitcoin,
-            "ethereum": row.ethereum,
+    db: Session = SessionLocal()
+    try:
+        columns, rows, next_cursor = load_market_history(
+            db, symbols=selected, start=start, end=end, limit=limit, cursor=cursor
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    finally:
+        db.close()
+
+    dates = [str(row[0]) for row in rows]
+    if format == "columns":
+        content = {
+            "columns": {
+                "date": dates,
+                **{column: [row[i] for row in rows] for i, column in enumerate(columns) if i > 0},
+            },
+            "next_cursor": str(next_cursor) if next_cursor else None,
         }
-        for row in data
-    ]
+    else:
+        content = [
+            {"date": day, **dict(zip(columns[1:], row[1:]))}
+            for day, row in zip(dates, rows)
+        ]
+
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor else None
+    return JSONResponse(content=content, headers=headers)
+
+
+@app.get("/api/history/{symbol}", tags=["Database"])
+def get_symbol_history(
+    symbol: str,
+    start: date | None = None,
+    end: date | None = None,
+    points: int | None = Query(None, ge=3, le=MAX_HISTORY_LIMIT),
+):
+    """
+    Returns one symbol's stored closes as {symbol, total, date: [...], price: [...]}.
+
+    points downsamples the range on the server with LTTB, keeping the shape
+    (peaks and troughs) of the series; total is the count before downsampling.
+    """
+    symbol = symbol.lower()
+    db: Session = SessionLocal()
+    try:
+        dates, prices = load_symbol_history(db, symbol, start=start, end=end)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    finally:
+        db.close()
+
+    total = len(dates)
+    if points is not None and total > points:
+        day_numbers = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+        kept = lttb(day_numbers, prices, points)
+        dates = [dates[i] for i in kept]
+        prices = [prices[i] for i in kept]
+
+    return {
+        "symbol": symbol,
+        "total": total,
+        "date": [str(day) for day in dates],
+        "price": prices,
+    }
+
+
+# --- CALCULATED METRIC HISTORY ---
+@app.get("/api/metrics/backfill", tags=["Database"])
+def metrics_backfill():
+    """Backfills calculated metric history; later runs append only new dates."""
+    try:
+        return {"rows_written": get_metric_history()}
+    except Exception as e:
+        print("ERROR in /metrics/backfill:", e)
+        return {"error": str(e)}
+
+
+@app.get("/api/metrics/{metric_name}/history", tags=["Database"])
+def metric_history(metric_name: str, start: date | None = None, end: date | None = None):
+    """Returns the stored daily series for one calculated metric."""
+    db: Session = SessionLocal()
+    try:
+        rows = load_metric_history(db, metric_name, start=start, end=end)
+    finally:
+        db.close()
+
+    return [{"timestamp": row["timestamp"], "value": row["value"], "window": row["window"]} for row in rows]
 
 
 # --- MACRO DATA ---
@@ -98,40 +185,112 @@ def get_macro():
         for r in data
     ]
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires.
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def _accepts_gzip(accept_encoding: str | None) -> bool:
+    """Whether Accept-Encoding allows gzip: listed (or matched by *) with a q-value above 0."""
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    for coding in ("gzip", "x-gzip"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return qualities.get("*", 0.0) > 0
+
+
 @app.get("/api/overview")
-def api_overview(force_refresh: bool = False):
-    data = build_overview_snapshot(force_refresh=force_refresh)
-    return JSONResponse(content=data)
+def api_overview(request: Request, force_refresh: bool = False):
+    """Pre-encoded overview snapshot; gzip when accepted, 304 when the ETag still matches."""
+    snapshot, age = get_overview_snapshot(force_refresh=force_refresh)
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "Age": str(int(age)),
+        "X-Snapshot-Age": f"{age:.3f}",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+
+    if _accepts_gzip(request.headers.get("accept-encoding")):
+        return Response(
+            content=snapshot.body_gzip,
+            media_type="application/json",
+            headers={**headers, "Content-Encoding": "gzip"},
+        )
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 # --- LLM SUMMARY ---
 
+# (step name, callable, steps it depends on). Provider steps are independent
+# and run concurrently; calculated_metrics waits for the tables it reads.
 INGESTION_STEPS = (
-    ("market_data", get_market_data),
-    ("macro_data", get_macro_data),
-    ("crypto_quotes", get_crypto_quotes),
-    ("equity_quotes", get_equity_quotes),
-    ("calculated_metrics", get_calculated_metrics),
+    ("market_data", get_market_data, ()),
+    ("macro_data", get_macro_data, ()),
+    ("crypto_quotes", get_crypto_quotes, ()),
+    ("equity_quotes", get_equity_quotes, ()),
+    ("calculated_metrics", get_calculated_metrics, ("market_data", "macro_data", "crypto_quotes")),
+    ("metric_history", get_metric_history, ("calculated_metrics",)),
 )
 
 
+def _refresh_overview_step() -> dict:
+    # Runs even when a step failed: whatever did get written moved the data
+    # version, and API workers should find that snapshot already encoded.
+    started = time.perf_counter()
+    entry = {"step": "overview_snapshot"}
+    try:
+        size = refresh_overview_snapshot()
+        entry.update(status="success", bytes=size)
+    except Exception as exc:
+        entry.update(status="failed", error=str(exc))
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    return entry
+
+
 def _run_daily_ingestion() -> list[dict]:
+    results = run_task_graph(INGESTION_STEPS)
+
     report = []
-    for step_name, step_fn in INGESTION_STEPS:
-        try:
-            result = step_fn()
-            rows = len(result) if hasattr(result, "__len__") else result
-            report.append({
-                "step": step_name,
-                "status": "success",
-                "rows": rows,
-            })
-        except Exception as exc:
-            report.append({
-                "step": step_name,
-                "status": "failed",
-                "error": str(exc),
-            })
-            raise RuntimeError(f"Ingestion failed at step '{step_name}': {exc}") from exc
+    for step_name, result in results.items():
+        entry = {
+            "step": step_name,
+            "status": result.status,
+            "seconds": round(result.seconds, 3),
+        }
+        if result.status == "success":
+            value = result.value
+            entry["rows"] = len(value) if hasattr(value, "__len__") else value
+        else:
+            entry["error"] = result.error
+        report.append(entry)
+    report.append(_refresh_overview_step())
+
+    failed = [result for result in results.values() if result.status == "failed"]
+    if failed:
+        first = failed[0]
+        raise RuntimeError(f"Ingestion failed at step '{first.name}': {first.error}")
+
     return report
 
 
@@ -159,49 +318,85 @@ def _get_or_compute_today_market_state(db: Session, run_ingestion: bool) -> dict
     return market_state
 
 
-@app.get("/api/compute/daily")
-def compute_daily(skip_ingestion: bool = False):
+def _compute_daily(skip_ingestion: bool) -> dict:
+    ingestion_report = []
+    if not skip_ingestion:
+        ingestion_report = _run_daily_ingestion()
+
+    db: Session = SessionLocal()
     try:
-        ingestion_report = []
-        if not skip_ingestion:
-            ingestion_report = _run_daily_ingestion()
+        market_state = build_market_state(db)
+        _save_market_state(db, market_state)
+    finally:
+        db.close()
 
-        db: Session = SessionLocal()
-        try:
-            market_state = build_market_state(db)
-            _save_market_state(db, market_state)
-        finally:
-            db.close()
+    return {
+        "ingestion": ingestion_report,
+        "market_state": market_state,
+    }
 
-        return {
-            "ingestion": ingestion_report,
-            "market_state": market_state,
-        }
+
+@app.get("/api/compute/daily")
+def compute_daily(skip_ingestion: bool = False):
+    try:
+        return single_flight(
+            f"compute_daily:skip_ingestion={skip_ingestion}",
+            lambda: _compute_daily(skip_ingestion),
+            cross_process=True,
+        )
 
     except Exception as e:
         print("ERROR in compute/daily:", e)
         return {"error": str(e)}
 
+@app.get("/api/maintenance/retention")
+def maintenance_retention():
+    """Compact old quote snapshots, collapse superseded metrics and prune run history."""
+    try:
+        return run_retention()
+    except Exception as e:
+        print("ERROR in /maintenance/retention:", e)
+        return {"error": str(e)}
+
+def _create_daily_summary(today: date, refresh_data: bool) -> dict:
+    db: Session = SessionLocal()
+    try:
+        # Another request or worker may have stored it while this one waited.
+        existing_summary = db.query(MarketSummary).filter(MarketSummary.date == today).first()
+        if existing_summary:
+            return existing_summary.summary
+
+        market_state = _get_or_compute_today_market_state(db, run_ingestion=refresh_data)
+        summary = generate_summary(market_state)
+
+        db.add(MarketSummary(date=today, summary=summary))
+        db.commit()
+
+        return summary
+    finally:
+        db.close()
+
+
 @app.get("/api/summary/daily")
 def summary_daily(refresh_data: bool = False):
     try:
+        today = date.today()
+
         db: Session = SessionLocal()
         try:
-            today = date.today()
-
             existing_summary = db.query(MarketSummary).filter(MarketSummary.date == today).first()
-            if existing_summary:
-                return existing_summary.summary
-
-            market_state = _get_or_compute_today_market_state(db, run_ingestion=refresh_data)
-            summary = generate_summary(market_state)
-
-            db.add(MarketSummary(date=today, summary=summary))
-            db.commit()
-
-            return summary
         finally:
             db.close()
+        if existing_summary:
+            return existing_summary.summary
+
+        # Keyed on the date alone: there is one summary row per day, so
+        # refresh_data callers share the same Gemini call.
+        return single_flight(
+            f"summary_daily:{today.isoformat()}",
+            lambda: _create_daily_summary(today, refresh_data),
+            cross_process=True,
+        )
 
     except Exception as e:
         print("ERROR in /summary/daily:", e)
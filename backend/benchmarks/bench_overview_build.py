@@ -0,0 +1,119 @@
+"""
+Benchmark the data loading of one overview snapshot build.
+
+Compares the old load pattern, where each section loaded its own frames
+(market_data twice, one session per loader) and every memoized step looked
+up the data version itself, with the shared OverviewData context built
+for a data version resolved once by the caller (as revalidation does).
+Memo entries are cleared before every call so each iteration does the
+full work. By default the history cache is disabled so every frame load
+is a database read; --cache measures cache-backed loads instead.
+
+Run from backend/ against a populated database:
+    python -m benchmarks.bench_overview_build
+    python -m benchmarks.bench_overview_build --cache
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+import overview_service
+import services.history_cache as history_cache
+from correlation_service import build_correlations
+from db import SessionLocal, engine
+from services.data_version import current_data_version
+from signals_engine import generate_sentiment_series, load_market_data
+
+
+ITERATIONS = 5
+
+
+def _clear_memos():
+    build_correlations.cache_clear()
+    generate_sentiment_series.cache_clear()
+
+
+def _separate_loads(version):
+    # The pre-context path: every loader opens its own session, the
+    # sentiment stage reloads market_data, and each memoized step resolves
+    # the data version on its own.
+    _clear_memos()
+    market = load_market_data()
+    macro = overview_service._load_macro_df()
+    macro_daily = macro.asfreq("B").ffill()
+    session = SessionLocal()
+    try:
+        overview_service._load_stored_closes(overview_service.STORED_TICKERS, session.bind)
+    finally:
+        session.close()
+    build_correlations(market, macro_daily)
+    generate_sentiment_series()
+
+
+def _shared_context(version):
+    _clear_memos()
+    data = overview_service.load_overview_data(version)
+    build_correlations(data.market, data.macro_daily, data.returns, data_version=version)
+    generate_sentiment_series(data.market, data.returns, data_version=version)
+
+
+def _measure(label, fn, version, iterations) -> None:
+    counts = {"statements": 0, "checkouts": 0}
+
+    def on_execute(*_):
+        counts["statements"] += 1
+
+    def on_checkout(*_):
+        counts["checkouts"] += 1
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    event.listen(engine.pool, "checkout", on_checkout)
+    started = time.perf_counter()
+    try:
+        for _ in range(iterations):
+            fn(version)
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(engine, "before_cursor_execute", on_execute)
+        event.remove(engine.pool, "checkout", on_checkout)
+
+    # Separate pass: tracing slows allocation-heavy code too much to time it.
+    tracemalloc.start()
+    try:
+        fn(version)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    print(
+        f"{label:<24} {elapsed / iterations * 1000:8.1f} ms/build"
+        f"  {counts['statements'] / iterations:4.1f} queries"
+        f"  {counts['checkouts'] / iterations:4.1f} connections"
+        f"  {peak / 1e6:7.2f} MB peak"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache", action="store_true", help="read frames through the history cache")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    args = parser.parse_args()
+
+    if not args.cache:
+        history_cache.pa = None
+
+    # Resolved once per build by the caller, outside what is measured.
+    version = current_data_version()
+    # Warm imports and connections so neither side pays first-call costs.
+    _shared_context(version)
+
+    print(f"{engine.dialect.name}, history cache {'on' if history_cache.cache_enabled() else 'off'}\n")
+    _measure("separate loads (before)", _separate_loads, version, args.iterations)
+    _measure("shared context (after)", _shared_context, version, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
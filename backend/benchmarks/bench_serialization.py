@@ -0,0 +1,114 @@
+"""
+Benchmark payload sanitizing and JSON encoding.
+
+Builds a synthetic payload shaped like /api/overview (cards, cross-asset
+rows and correlations with 30-point sparklines, sector and region tiles)
+out of NumPy floats with a few NaN/inf values, and times:
+
+  - the old per-float np.isnan/np.isinf walk followed by json.dumps
+  - services.serialization.sanitize followed by json.dumps (no orjson)
+  - services.serialization.dumps (orjson, when installed)
+
+Run from backend/:
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --sparkline 250
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from services import serialization
+from services.serialization import sanitize
+
+
+ITERATIONS = 2000
+
+
+def _legacy_sanitize(obj):
+    # The pre-serialization-layer walk from overview_service.
+    if isinstance(obj, dict):
+        return {k: _legacy_sanitize(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_legacy_sanitize(v) for v in obj]
+    if isinstance(obj, float):
+        if np.isnan(obj) or np.isinf(obj):
+            return None
+        return float(obj)
+    return obj
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _synthetic_payload(sparkline: int) -> dict:
+    rng = np.random.default_rng(42)
+
+    def values(n):
+        v = 1 + rng.normal(0, 0.01, n).cumsum()
+        v[rng.random(n) < 0.02] = np.nan
+        return list(v)  # np.float64 elements, as Series.iloc / list() produce
+
+    def change():
+        return np.float64(rng.normal(0, 1))
+
+    def row(i):
+        return {
+            "symbol": f"sym{i}", "name": f"Asset {i}", "price": np.float64(100 + i),
+            "change_1d": change(), "change_1w": change(), "change_1m": change(), "change_1y": np.float64(np.nan),
+            "sparkline": values(sparkline),
+        }
+
+    return {
+        "sentiment": {"score": change(), "label": "Neutral", "drivers": ["Equities ↑"], "equity_trend": "Up"},
+        "market_cards": [row(i) for i in range(9)],
+        "cross_asset": [row(i) for i in range(12)],
+        "correlations": [
+            {"pair": f"pair {i}", "key": f"k{i}", "correlation": change(), "label": "Neutral",
+             "interpretation": "", "trend_sparkline": values(sparkline)}
+            for i in range(3)
+        ],
+        "regions": [{"region": f"r{i}", "symbol": f"s{i}", "change_1m": change()} for i in range(4)],
+        "sectors": [{"sector": f"s{i}", "symbol": f"x{i}", "change_1m": change()} for i in range(10)],
+        "macro": {k: {"value": change(), "prev": change(), "direction": "up"} for k in ("cpi", "unemployment", "policy_rate")},
+        "yield": {"ten_year": np.float64(4.2), "two_ten_slope_bps": np.float64(np.inf), "slope_label": "Normal"},
+        "narrative": "Equities higher → risk-on tone.",
+    }
+
+
+def _time(label, fn, payload, iterations) -> bytes:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        body = fn(payload)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<36} {elapsed / iterations * 1e6:9.1f} µs/payload")
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sparkline", type=int, default=30, help="points per sparkline")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    args = parser.parse_args()
+
+    payload = _synthetic_payload(args.sparkline)
+    print(f"{len(_json_dumps(sanitize(payload))):,} byte payload\n")
+
+    results = [
+        _time("np.isnan walk + json (before)", lambda p: _json_dumps(_legacy_sanitize(p)), payload, args.iterations),
+        _time("sanitize + json (no orjson)", lambda p: _json_dumps(sanitize(p)), payload, args.iterations),
+    ]
+    if serialization.orjson is not None:
+        results.append(_time("dumps, orjson (after)", serialization.dumps, payload, args.iterations))
+    else:
+        print("orjson not installed; dumps() uses the sanitize + json path")
+
+    decoded = [json.loads(body) for body in results]
+    assert all(d == decoded[0] for d in decoded), "encoders disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 import numpy as np
 import pandas as pd
 
+from services.data_version import frame_key, memoize_on_data_version
+from services.serialization import finite_list
+
 
 _INTERPRETATIONS = {
     ("spx_vs_10y", "Positive"): "Reflation trade — equities and yields rising together",
@@ -41,7 +44,7 @@ def _compute_pair(key: str, pair_name: str, a: pd.Series, b: pd.Series) -> dict:
 
     rolling = a_aligned.rolling(60).corr(b_aligned).dropna()
     current_corr = float(rolling.iloc[-1])
-    trend_sparkline = [float(v) for v in rolling.tail(30).tolist()]
+    trend_sparkline = finite_list(rolling.tail(30))
     label = _label(current_corr)
 
     return {
@@ -54,12 +57,18 @@ def _compute_pair(key: str, pair_name: str, a: pd.Series, b: pd.Series) -> dict:
     }
 
 
-def build_correlations(market_df: pd.DataFrame, macro_daily: pd.DataFrame) -> list:
+@memoize_on_data_version(
+    key=lambda market_df, macro_daily, returns=None: (frame_key(market_df), frame_key(macro_daily))
+)
+def build_correlations(market_df: pd.DataFrame, macro_daily: pd.DataFrame, returns: pd.DataFrame = None) -> list:
+    """Rolling correlation pairs; returns are market_df's daily % returns if already computed."""
+    if returns is None:
+        returns = market_df.pct_change()
     results = []
 
     # S&P vs 10Y
     if "sp500" in market_df.columns and "ten_year_yield" in macro_daily.columns:
-        spx_ret = market_df["sp500"].pct_change().dropna()
+        spx_ret = returns["sp500"].dropna()
         ten_bps = macro_daily["ten_year_yield"].diff().dropna() * 100
         results.append(_compute_pair("spx_vs_10y", "S&P 500 vs 10Y Yield", spx_ret, ten_bps))
     else:
@@ -71,8 +80,8 @@ def build_correlations(market_df: pd.DataFrame, macro_daily: pd.DataFrame) -> li
 
     # S&P vs DXY
     if "sp500" in market_df.columns and "usd_index" in market_df.columns:
-        spx_ret = market_df["sp500"].pct_change().dropna()
-        dxy_ret = market_df["usd_index"].pct_change().dropna()
+        spx_ret = returns["sp500"].dropna()
+        dxy_ret = returns["usd_index"].dropna()
         results.append(_compute_pair("spx_vs_dxy", "S&P 500 vs DXY", spx_ret, dxy_ret))
     else:
         results.append({
@@ -83,7 +92,7 @@ def build_correlations(market_df: pd.DataFrame, macro_daily: pd.DataFrame) -> li
 
     # Gold vs 10Y
     if "gold" in market_df.columns and "ten_year_yield" in macro_daily.columns:
-        gold_ret = market_df["gold"].pct_change().dropna()
+        gold_ret = returns["gold"].dropna()
         ten_bps = macro_daily["ten_year_yield"].diff().dropna() * 100
         results.append(_compute_pair("gold_vs_10y", "Gold vs 10Y Yield", gold_ret, ten_bps))
     else:
@@ -1,29 +1,73 @@
-from datetime import datetime, timezone
+from datetime import datetime, time, timedelta, timezone
 
 from db import SessionLocal
 from providers.coingecko_provider import fetch_crypto_quotes
-from providers.finnhub_provider import fetch_equity_quotes
+from providers.finnhub_provider import fetch_equity_quote_batch
 from providers.fred_provider import fetch_macro_data
-from providers.yahoo_provider import fetch_market_data
+from providers.yahoo_provider import closes_frame, fetch_price_history
 from schemas.source_types import COINGECKO, FINNHUB, FRED, INTERNAL, YAHOO
 from services.calculation_service import refresh_calculated_metrics
+from services.history_cache import refresh_history_cache
+from services.metric_backfill import backfill_metric_history
 from services.ingestion_service import (
+    MARKET_DATA_COLUMNS,
     ingest_crypto_quotes,
     ingest_equity_quotes,
     ingest_macro_data,
     ingest_market_data,
+    ingest_price_bars,
+    latest_macro_date,
+    latest_market_date,
     record_ingestion_run,
 )
 
 
-def get_market_data():
+# Incremental refreshes re-fetch this many days before the latest stored bar
+# so late prints and vendor revisions overwrite the stored values.
+MARKET_OVERLAP_DAYS = 7
+
+# FRED revises recent observations (GDP estimates, CPI seasonal factors), so
+# incremental macro refreshes re-request this much history. It must also hold
+# at least one print of every series: GDPC1 is quarterly and published about
+# a month after the quarter, so its latest point can be ~6 months old, and the
+# fetched frame is forward-filled then stripped of incomplete rows.
+MACRO_REVISION_LOOKBACK_DAYS = 400
+
+
+def _format_failures(failures):
+    if not failures:
+        return None
+
+    return "; ".join(f"{symbol}: {error}" for symbol, error in sorted(failures.items()))
+
+
+def get_market_data(incremental=True):
+    """
+    Refresh market_data and price_bars from Yahoo Finance.
+
+    In incremental mode only bars after the latest stored date (minus a
+    small overlap) are fetched and upserted. An empty table, or
+    incremental=False, falls back to a full reload.
+    """
     started_at = datetime.now(timezone.utc).replace(tzinfo=None)
     db = SessionLocal()
     df = None
 
     try:
-        df = fetch_market_data()
-        rows_written = ingest_market_data(db, df)
+        start = None
+        if incremental:
+            latest = latest_market_date(db)
+            if latest is not None:
+                start = datetime.combine(latest - timedelta(days=MARKET_OVERLAP_DAYS), time.min)
+
+        history = fetch_price_history(start=start)
+        # market_data keeps its fixed column set; every fetched symbol,
+        # including ones without a market_data column, goes to price_bars.
+        df = closes_frame(history, names=MARKET_DATA_COLUMNS)
+        rows_written = ingest_market_data(db, df, incremental=start is not None)
+        # price_bars-only symbols (e.g. URTH) feed the overview too, so their
+        # writes must move the data version as well.
+        rows_written += ingest_price_bars(db, history)
         record_ingestion_run(
             db=db,
             source=YAHOO,
@@ -34,6 +78,8 @@ def get_market_data():
             rows_fetched=len(df),
             rows_written=rows_written,
         )
+        # After the run is recorded, so the cache stamp includes it.
+        refresh_history_cache("market_data", db.bind)
         return df
     except Exception as exc:
         db.rollback()
@@ -53,18 +99,27 @@ def get_market_data():
         db.close()
 
 
-def get_macro_data():
+def get_macro_data(incremental=True):
     """
     Fetch key macroeconomic indicators from the Federal Reserve (FRED).
     Returns a pandas DataFrame with monthly/quarterly data and saves to DB.
+
+    In incremental mode only observations from MACRO_REVISION_LOOKBACK_DAYS
+    before the latest stored date are requested and upserted.
     """
     started_at = datetime.now(timezone.utc).replace(tzinfo=None)
     db = SessionLocal()
     macro_df = None
 
     try:
-        macro_df = fetch_macro_data()
-        rows_written = ingest_macro_data(db, macro_df)
+        observation_start = None
+        if incremental:
+            latest = latest_macro_date(db)
+            if latest is not None:
+                observation_start = latest - timedelta(days=MACRO_REVISION_LOOKBACK_DAYS)
+
+        macro_df = fetch_macro_data(observation_start=observation_start)
+        rows_written = ingest_macro_data(db, macro_df, incremental=observation_start is not None)
         record_ingestion_run(
             db=db,
             source=FRED,
@@ -75,6 +130,8 @@ def get_macro_data():
             rows_fetched=len(macro_df),
             rows_written=rows_written,
         )
+        # After the run is recorded, so the cache stamp includes it.
+        refresh_history_cache("macro_data", db.bind)
         return macro_df
     except Exception as exc:
         db.rollback()
@@ -137,7 +194,10 @@ def get_equity_quotes():
     rows = None
 
     try:
-        rows = fetch_equity_quotes()
+        rows, failures = fetch_equity_quote_batch()
+        if not rows:
+            raise RuntimeError(f"No Finnhub quotes fetched: {failures}")
+
         rows_written = ingest_equity_quotes(db, rows)
         record_ingestion_run(
             db=db,
@@ -148,6 +208,7 @@ def get_equity_quotes():
             status="success",
             rows_fetched=len(rows),
             rows_written=rows_written,
+            error_message=_format_failures(failures),
         )
         return rows
     except Exception as exc:
@@ -168,13 +229,13 @@ def get_equity_quotes():
         db.close()
 
 
-def get_calculated_metrics():
+def get_calculated_metrics(incremental=True):
     started_at = datetime.now(timezone.utc).replace(tzinfo=None)
     db = SessionLocal()
     rows_inspected = 0
 
     try:
-        rows_written, rows_inspected = refresh_calculated_metrics(db)
+        rows_written, rows_inspected = refresh_calculated_metrics(db, incremental=incremental)
         record_ingestion_run(
             db=db,
             source=INTERNAL,
@@ -204,6 +265,41 @@ def get_calculated_metrics():
         db.close()
 
 
+def get_metric_history():
+    started_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    db = SessionLocal()
+    rows_inspected = 0
+
+    try:
+        rows_written, rows_inspected = backfill_metric_history(db)
+        record_ingestion_run(
+            db=db,
+            source=INTERNAL,
+            job_name="calculated_metrics_backfill",
+            started_at=started_at,
+            finished_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            status="success",
+            rows_fetched=rows_inspected,
+            rows_written=rows_written,
+        )
+        return rows_written
+    except Exception as exc:
+        db.rollback()
+        record_ingestion_run(
+            db=db,
+            source=INTERNAL,
+            job_name="calculated_metrics_backfill",
+            started_at=started_at,
+            finished_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            status="failed",
+            rows_fetched=rows_inspected,
+            rows_written=0,
+            error_message=str(exc),
+        )
+        raise
+    finally:
+        db.close()
+
 
 if __name__ == "__main__":
     get_market_data()
@@ -211,4 +307,5 @@ if __name__ == "__main__":
     get_crypto_quotes()
     get_equity_quotes()
     get_calculated_metrics()
+    get_metric_history()
 
@@ -11,7 +11,9 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./insightpulse.db") # fall b
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         DATABASE_URL,
-        connect_args={"check_same_thread": False},
+        # Ingestion steps write from several threads; wait for the lock
+        # instead of failing fast with "database is locked".
+        connect_args={"check_same_thread": False, "timeout": 30},
         pool_pre_ping=True,
     )
 else:
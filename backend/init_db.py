@@ -1,6 +1,8 @@
 from db import Base, engine
+from migrations import apply_migrations
 from models import MarketData, MacroData, MarketState, MarketSummary
 
 print("Creating database tables...")
 Base.metadata.create_all(bind=engine)
+apply_migrations(engine)
 print("Done.")
@@ -5,30 +5,12 @@ from datetime import date
 from sqlalchemy.orm import Session
 
 from db import SessionLocal
-from overview_service import sanitize
+from services.data_version import memoize_on_data_version
 from services.metric_loader import load_latest_calculated_metrics
+from services.metric_registry import METRICS
+from services.serialization import sanitize
 
 
-MARKET_ASSETS = [
-    "sp500", "nasdaq", "vix", "gold", "usd_index", "bitcoin", "ethereum", "tlt",
-]
-
-MACRO_METRICS = [
-    "yield_curve_slope_10y_2y",
-    "real_rate_proxy",
-    "dxy_1d_return",
-    "btc_eth_ratio",
-]
-
-ASSET_METRIC_SUFFIXES = [
-    "5d_return",
-    "20d_volatility",
-    "drawdown_from_peak",
-    "price_zscore_252d",
-    "ma_distance_50d",
-    "ma_distance_200d",
-]
-
 REGIME_METRICS = [
     "yield_curve_slope_10y_2y",
     "real_rate_proxy",
@@ -49,16 +31,9 @@ ASSET_CLASSES = {
 }
 
 
-def _allowed_metric_names() -> set[str]:
-    names = set(MACRO_METRICS)
-    for asset in MARKET_ASSETS:
-        for suffix in ASSET_METRIC_SUFFIXES:
-            names.add(f"{asset}_{suffix}")
-    return names
-
-
 def _filter_metrics(metrics: dict) -> dict:
-    allowed = _allowed_metric_names()
+    """Keep only metrics declared in the registry."""
+    allowed = set(METRICS)
     return {name: row for name, row in metrics.items() if name in allowed}
 
 
@@ -86,10 +61,8 @@ def _display_value(metric_name: str, value: float):
 
 
 def _asset_from_metric(metric_name: str):
-    for asset in MARKET_ASSETS:
-        if metric_name.startswith(f"{asset}_"):
-            return asset
-    return None
+    spec = METRICS.get(metric_name)
+    return spec.asset if spec else None
 
 
 def _z_for_metric(metric_name: str, metrics: dict):
@@ -337,7 +310,9 @@ def _build_evidence(metrics: dict, evidence_ids: set[str]) -> dict:
     return evidence
 
 
+@memoize_on_data_version(key=lambda db=None: date.today())
 def build_market_state(db: Session | None = None) -> dict:
+    """MarketState for today; cached per day until the data version changes."""
     own_session = db is None
     if own_session:
         db = SessionLocal()
@@ -0,0 +1,147 @@
+"""Idempotent migrations for databases created before a constraint existed."""
+
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+
+from db import Base
+
+
+def _dedupe(conn, table, columns) -> int:
+    """Keep the newest row (highest id) for each key, delete the rest."""
+    key = ", ".join(columns)
+    result = conn.execute(text(
+        f"DELETE FROM {table.name} WHERE id NOT IN "
+        f"(SELECT MAX(id) FROM {table.name} GROUP BY {key})"
+    ))
+    return result.rowcount or 0
+
+
+# Quote rows used to be stamped with fetch time, so every call stored another
+# copy of the same observation. Before (symbol, timestamp) becomes unique,
+# consecutive snapshots of a symbol with identical values are collapsed to
+# the earliest one.
+REPEATED_SNAPSHOT_COLUMNS = {
+    "equity_quotes": ["price", "change", "percent_change", "high", "low", "open", "previous_close"],
+    "crypto_quotes": ["price", "market_cap", "volume_24h", "change_24h"],
+}
+
+
+def _delete_ids(conn, table, ids, chunk_size=500) -> None:
+    statement = text(f"DELETE FROM {table.name} WHERE id IN :ids").bindparams(
+        bindparam("ids", expanding=True)
+    )
+    for start in range(0, len(ids), chunk_size):
+        conn.execute(statement, {"ids": ids[start:start + chunk_size]})
+
+
+def _collapse_repeated_snapshots(conn, table, value_columns) -> int:
+    df = pd.read_sql(
+        text(f"SELECT id, symbol, {', '.join(value_columns)} FROM {table.name} ORDER BY symbol, timestamp, id"),
+        conn,
+    )
+    if df.empty:
+        return 0
+
+    values = df[value_columns]
+    previous = df.groupby("symbol")[value_columns].shift()
+    unchanged = ((values == previous) | (values.isna() & previous.isna())).all(axis=1)
+    repeated = unchanged & (df.groupby("symbol").cumcount() > 0)
+
+    ids = [int(value) for value in df.loc[repeated, "id"]]
+    _delete_ids(conn, table, ids)
+    return len(ids)
+
+
+def _ensure_unique_index(conn, index) -> bool:
+    table = index.table
+    existing = {ix["name"]: ix for ix in inspect(conn).get_indexes(table.name)}
+    current = existing.get(index.name)
+    if current is not None and current.get("unique"):
+        return False
+
+    if table.name in REPEATED_SNAPSHOT_COLUMNS:
+        collapsed = _collapse_repeated_snapshots(conn, table, REPEATED_SNAPSHOT_COLUMNS[table.name])
+        if collapsed:
+            print(f"Collapsed {collapsed} repeated snapshots in {table.name}")
+
+    columns = [column.name for column in index.columns]
+    removed = _dedupe(conn, table, columns)
+    if removed:
+        print(f"Removed {removed} duplicate rows from {table.name} on ({', '.join(columns)})")
+
+    if current is not None:
+        conn.execute(text(f"DROP INDEX {index.name}"))
+    index.create(conn)
+    print(f"Created unique index {index.name}")
+    return True
+
+
+def _seed_price_bars(conn) -> None:
+    """Populate an empty price_bars table with the closes already in market_data."""
+    if conn.execute(text("SELECT 1 FROM price_bars LIMIT 1")).first() is not None:
+        return
+
+    wide = pd.read_sql(text("SELECT * FROM market_data"), conn).drop(columns=["id"])
+    if wide.empty:
+        return
+
+    long_df = wide.melt(id_vars="date", var_name="symbol", value_name="close").dropna(subset=["close"])
+    long_df["date"] = pd.to_datetime(long_df["date"]).dt.date
+    long_df.to_sql("price_bars", conn, if_exists="append", index=False, chunksize=1000)
+    print(f"Seeded {len(long_df)} price bars from market_data")
+
+
+def _ensure_index(conn, index) -> bool:
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(index.table.name)}
+    if index.name in existing:
+        return False
+    index.create(conn)
+    print(f"Created index {index.name}")
+    return True
+
+
+def _seed_latest_calculated_metrics(conn) -> None:
+    """Populate an empty latest_calculated_metrics from the calculated_metrics history."""
+    if conn.execute(text("SELECT 1 FROM latest_calculated_metrics LIMIT 1")).first() is not None:
+        return
+
+    history = pd.read_sql(
+        text(
+            'SELECT id, metric_name, category, timestamp, value, "window", source_dependencies, '
+            "calculation_version, updated_at FROM calculated_metrics"
+        ),
+        conn,
+    )
+    if history.empty:
+        return
+
+    latest = history.sort_values(["metric_name", "timestamp", "id"]).groupby("metric_name").tail(1)
+    latest.drop(columns=["id"]).to_sql("latest_calculated_metrics", conn, if_exists="append", index=False)
+    print(f"Seeded {len(latest)} latest calculated metrics")
+
+
+def apply_migrations(engine) -> None:
+    """
+    Bring existing tables in line with the indexes declared on the models.
+
+    create_all() never alters existing tables, so older databases still have
+    plain indexes where the models now declare unique ones, and lack newly
+    declared composite indexes. Duplicate rows are collapsed to the newest
+    before a unique index is built.
+    """
+    with engine.begin() as conn:
+        tables = set(inspect(conn).get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            for index in table.indexes:
+                if index.unique:
+                    _ensure_unique_index(conn, index)
+                else:
+                    _ensure_index(conn, index)
+
+        if "price_bars" in tables and "market_data" in tables:
+            _seed_price_bars(conn)
+
+        if "latest_calculated_metrics" in tables and "calculated_metrics" in tables:
+            _seed_latest_calculated_metrics(conn)
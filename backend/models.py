@@ -1,12 +1,12 @@
 from sqlalchemy import Column, Integer, Float, Date, JSON, String
-from sqlalchemy import Column, Date, DateTime, Float, Integer, String, Text
+from sqlalchemy import Column, Date, DateTime, Float, Index, Integer, LargeBinary, String, Text
 from db import Base
 
 class MarketData(Base):
     __tablename__ = "market_data"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, index=True)
+    date = Column(Date, unique=True, index=True)
 
     # --- Equities ---
     sp500 = Column(Float)
@@ -60,11 +60,30 @@ class MarketData(Base):
     ethereum = Column(Float)
 
 
+class PriceBar(Base):
+    """Long-format daily bars: one row per (symbol, date), any number of symbols."""
+
+    __tablename__ = "price_bars"
+    __table_args__ = (
+        # Serves both the upsert conflict target and single-symbol range scans.
+        Index("ux_price_bars_symbol_date", "symbol", "date", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False)
+    date = Column(Date, nullable=False, index=True)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
+
+
 class MacroData(Base):
     __tablename__ = "macro_data"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, index=True)
+    date = Column(Date, unique=True, index=True)
 
     # --- Core Macro Indicators ---
     cpi = Column(Float)               # Inflation (CPIAUCSL)
@@ -90,8 +109,28 @@ class MarketSummary(Base):
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, unique=True, index=True)
     summary = Column(JSON) 
+
+
+class OverviewSnapshot(Base):
+    """/api/overview payload per data version, stored pre-encoded for direct serving."""
+
+    __tablename__ = "overview_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    data_version = Column(Integer, unique=True, index=True, nullable=False)
+    etag = Column(String, nullable=False)
+    body = Column(LargeBinary, nullable=False)  # UTF-8 JSON
+    body_gzip = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime)
+
+
 class EquityQuote(Base):
     __tablename__ = "equity_quotes"
+    __table_args__ = (
+        # timestamp is the provider's observation time, so repeated fetches
+        # of the same quote collapse onto one row.
+        Index("ux_equity_quotes_symbol_timestamp", "symbol", "timestamp", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String)
@@ -111,6 +150,9 @@ class EquityQuote(Base):
 
 class CryptoQuote(Base):
     __tablename__ = "crypto_quotes"
+    __table_args__ = (
+        Index("ux_crypto_quotes_symbol_timestamp", "symbol", "timestamp", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String)
@@ -125,6 +167,53 @@ class CryptoQuote(Base):
     updated_at = Column(DateTime)
 
 
+class QuoteDailyBar(Base):
+    """Daily OHLC roll-up of equity/crypto quote snapshots past raw retention."""
+
+    __tablename__ = "quote_daily_bars"
+    __table_args__ = (
+        Index("ux_quote_daily_bars_type_symbol_date", "asset_type", "symbol", "date", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    asset_type = Column(String, nullable=False)  # "equity" or "crypto"
+    symbol = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    samples = Column(Integer)
+    first_timestamp = Column(DateTime)
+    last_timestamp = Column(DateTime)
+    source = Column(String)
+
+
+class MetricRollingState(Base):
+    """Persisted rolling-window state per market asset for incremental metric updates."""
+
+    __tablename__ = "metric_rolling_state"
+
+    id = Column(Integer, primary_key=True, index=True)
+    asset = Column(String, unique=True, index=True, nullable=False)
+    last_date = Column(Date)
+    state = Column(JSON)
+    calculation_version = Column(String)
+    updated_at = Column(DateTime)
+
+
+class MetricInputHash(Base):
+    """Digest of the inputs each calculated metric was last computed from."""
+
+    __tablename__ = "metric_input_hashes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    metric_name = Column(String, unique=True, index=True, nullable=False)
+    input_hash = Column(String, nullable=False)
+    calculation_version = Column(String)
+    updated_at = Column(DateTime)
+
+
 class IngestionRun(Base):
     __tablename__ = "ingestion_runs"
 
@@ -142,6 +231,10 @@ class IngestionRun(Base):
 
 class CalculatedMetric(Base):
     __tablename__ = "calculated_metrics"
+    __table_args__ = (
+        # Per-metric history reads and the latest-row rebuild in migrations.
+        Index("ix_calculated_metrics_name_timestamp", "metric_name", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     metric_name = Column(String)
@@ -153,3 +246,19 @@ class CalculatedMetric(Base):
     calculation_version = Column(String)
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
+
+
+class LatestCalculatedMetric(Base):
+    """Newest calculated_metrics row per metric, maintained alongside every insert."""
+
+    __tablename__ = "latest_calculated_metrics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    metric_name = Column(String, unique=True, index=True, nullable=False)
+    category = Column(String)
+    timestamp = Column(DateTime)
+    value = Column(Float)
+    window = Column(String)
+    source_dependencies = Column(Text)
+    calculation_version = Column(String)
+    updated_at = Column(DateTime)
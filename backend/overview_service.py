@@ -1,20 +1,43 @@
 # backend/overview_service.py
+import os
+import threading
 import time
-from typing import Dict, List, Any
+from dataclasses import dataclass
 
 import numpy as np
 import pandas as pd
-import yfinance as yf
 
 from db import SessionLocal
+from services.data_version import current_data_version, memoize_on_data_version
+from services.history_cache import load_cached_history
+from services.price_loader import load_price_matrix
+from services.serialization import finite_list
+from services.single_flight import single_flight
+from services.snapshot_store import EncodedSnapshot, encode_snapshot, load_snapshot, save_snapshot
+from services.task_graph import run_task_graph
 from signals_engine import generate_sentiment_series, load_market_data
 
 
 # --------------------------------------------------------
-# Cache
+# Stale-while-revalidate snapshot
 # --------------------------------------------------------
-_CACHE: Dict[str, Any] = {"ts": 0.0, "data": None}
-CACHE_TTL_SECONDS = 300  # 5 minutes
+# Requests never wait for a rebuild once a snapshot exists; at most this
+# often a background thread checks the data version and rebuilds if it moved.
+REVALIDATE_INTERVAL_SECONDS = float(os.getenv("OVERVIEW_REVALIDATE_SECONDS", "5"))
+
+# A degraded snapshot is rebuilt after this delay even if the data version
+# has not moved, doubling after each degraded retry up to the maximum. A new
+# data version is always built right away.
+DEGRADED_RETRY_SECONDS = float(os.getenv("OVERVIEW_DEGRADED_RETRY_SECONDS", "30"))
+DEGRADED_RETRY_MAX_SECONDS = float(os.getenv("OVERVIEW_DEGRADED_RETRY_MAX_SECONDS", "600"))
+
+# EncodedSnapshot currently served; replaced as a whole.
+_snapshot = None
+_last_check = 0.0
+_refresh_lock = threading.Lock()
+# Data version of the degraded snapshot being served, its current retry
+# delay, and the monotonic time of the next retry.
+_degraded = {"version": None, "delay": 0.0, "retry_at": 0.0}
 
 
 # --------------------------------------------------------
@@ -44,6 +67,12 @@ SECTOR_MAP = {
     "xlc": "Communication Services",
 }
 
+# Tickers without a market_data column, read from price_bars. Ingestion
+# stores them with the rest of the Yahoo universe, so snapshot builds never
+# call the network.
+STORED_TICKERS = ["urth"]
+STORED_TICKER_LOOKBACK_DAYS = 92
+
 REGION_TILES = [
     ("US", "sp500"),
     ("Europe", "vgk"),
@@ -52,42 +81,28 @@ REGION_TILES = [
 ]
 
 
-# --------------------------------------------------------
-# Sanitizer for JSON (critical fix)
-# --------------------------------------------------------
-def sanitize(obj):
-    """Recursively clean NaN/inf so JSON won't crash."""
-    if isinstance(obj, dict):
-        return {k: sanitize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [sanitize(v) for v in obj]
-    if isinstance(obj, float):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-        return float(obj)
-    return obj
-
-
 # --------------------------------------------------------
 # Helpers
 # --------------------------------------------------------
-def _load_macro_df():
-    session = SessionLocal()
-    try:
-        df = pd.read_sql("SELECT * FROM macro_data ORDER BY date", session.bind)
-    finally:
-        session.close()
-
-    if df.empty:
-        raise RuntimeError("macro_data is empty")
-
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.set_index("date").sort_index()
-
+def _load_macro_df(bind=None):
     cols = [
         "cpi", "unemployment", "fed_funds_rate", "gdp",
         "two_year_yield", "ten_year_yield",
     ]
+
+    if bind is not None:
+        df = load_cached_history("macro_data", bind, cols)
+    else:
+        session = SessionLocal()
+        try:
+            df = load_cached_history("macro_data", session.connection(), cols)
+        finally:
+            session.close()
+
+    if df.empty:
+        raise RuntimeError("macro_data is empty")
+
+    df = df.sort_index()
     cols = [c for c in cols if c in df.columns]
     return df[cols].astype(float)
 
@@ -114,7 +129,7 @@ def _sparkline(series: pd.Series, length: int = 30):
     base = s.iloc[0]
     if base == 0 or pd.isna(base):
         return []
-    return (s / base).tolist()
+    return finite_list(s / base)
 
 
 def _classify_risk(score: float):
@@ -138,31 +153,68 @@ def _classify_equity_trend(spx: pd.Series):
     return "Neutral"
 
 
-def _fetch_live_ticker(ticker: str, name: str, group: str):
-    """Fetch a single ticker from yfinance and return a cross-asset row dict."""
+def _load_stored_closes(symbols, bind) -> pd.DataFrame:
+    """Closes from price_bars for symbols outside market_data (no network I/O)."""
+    return load_price_matrix(bind, symbols=symbols)
+
+
+@dataclass(frozen=True)
+class OverviewData:
+    """Frames one snapshot build reads, loaded once and shared by every section."""
+    market: pd.DataFrame
+    macro: pd.DataFrame
+    macro_daily: pd.DataFrame
+    stored_closes: pd.DataFrame
+    # Daily % returns of market, shared by correlations and sentiment.
+    returns: pd.DataFrame
+    # Version the frames were read at; memoized sections are keyed on it.
+    data_version: int
+
+
+def load_overview_data(data_version=None) -> OverviewData:
+    """Load everything a snapshot build needs over a single connection."""
+    session = SessionLocal()
     try:
-        raw = yf.download(ticker, period="3mo", interval="1d", auto_adjust=True, progress=False)
-        if raw.empty:
-            return None
-        close = raw["Close"].dropna()
-        if len(close) < 5:
-            return None
-        price = float(close.iloc[-1])
-        change_1d = _pct_change(close, 1)
-        sparkline = _sparkline(close, 30)
-        return {
-            "group": group,
-            "name": name,
-            "symbol": ticker,
-            "price": price,
-            "change_1d": change_1d,
-            "sparkline": sparkline,
-        }
-    except Exception:
+        if data_version is None:
+            data_version = current_data_version(session)
+        connection = session.connection()
+        market = load_market_data(bind=connection)
+        macro = _load_macro_df(bind=connection)
+        stored_closes = _load_stored_closes(STORED_TICKERS, connection)
+    finally:
+        session.close()
+
+    return OverviewData(
+        market=market,
+        macro=macro,
+        macro_daily=macro.asfreq("B").ffill(),
+        stored_closes=stored_closes,
+        returns=market.pct_change(),
+        data_version=data_version,
+    )
+
+
+def _stored_ticker_row(closes: pd.DataFrame, column: str, name: str, symbol: str, group: str):
+    """Cross-asset row for a stored ticker over the same ~3 month window the live fetch used."""
+    if closes is None or column not in closes.columns:
+        return None
+    close = closes[column].dropna()
+    if close.empty:
         return None
+    close = close[close.index >= close.index[-1] - pd.Timedelta(days=STORED_TICKER_LOOKBACK_DAYS)]
+    if len(close) < 5:
+        return None
+    return {
+        "group": group,
+        "name": name,
+        "symbol": symbol,
+        "price": float(close.iloc[-1]),
+        "change_1d": _pct_change(close, 1),
+        "sparkline": _sparkline(close, 30),
+    }
 
 
-def _build_cross_asset(market_df: pd.DataFrame, macro_daily: pd.DataFrame) -> list:
+def _build_cross_asset(market_df: pd.DataFrame, macro_daily: pd.DataFrame, stored_closes=None) -> list:
     rows = []
 
     def _row(group, name, symbol, series):
@@ -187,7 +239,7 @@ def _build_cross_asset(market_df: pd.DataFrame, macro_daily: pd.DataFrame) -> li
         r = _row("Equities", "NASDAQ", "nasdaq", market_df["nasdaq"])
         if r:
             rows.append(r)
-    msci = _fetch_live_ticker("URTH", "MSCI World", "Equities")
+    msci = _stored_ticker_row(stored_closes, "urth", "MSCI World", "URTH", "Equities")
     if msci:
         rows.append(msci)
 
@@ -214,20 +266,20 @@ def _build_cross_asset(market_df: pd.DataFrame, macro_daily: pd.DataFrame) -> li
             s30 = slope.tail(30)
             med = float(s30.median())
             if abs(med) > 0.1:
-                sparkline = (s30 / med).tolist()
+                sparkline = finite_list(s30 / med)
             else:
                 rng = s30.max() - s30.min()
                 if rng > 0:
-                    sparkline = ((s30 - s30.min()) / rng).tolist()
+                    sparkline = finite_list((s30 - s30.min()) / rng)
                 else:
-                    sparkline = [float(v) for v in s30.tolist()]
+                    sparkline = finite_list(s30)
             rows.append({
                 "group": "Rates",
                 "name": "Yield Curve Slope",
                 "symbol": "slope_2s10s",
                 "price": price_bps,
                 "change_1d": change_1d_bps,
-                "sparkline": [float(v) for v in sparkline],
+                "sparkline": sparkline,
             })
 
     # FX
@@ -298,30 +350,150 @@ def _narrative(spx1d, dxy1d, tenbps, risk):
 # --------------------------------------------------------
 # Main snapshot builder
 # --------------------------------------------------------
-def build_overview_snapshot(force_refresh=False):
-    now = time.time()
-    if not force_refresh and _CACHE["data"] and (now - _CACHE["ts"] < CACHE_TTL_SECONDS):
-        return _CACHE["data"]
-
-    # load DB data
-    market_df = load_market_data()
-    macro_df = _load_macro_df()
-    macro_daily = macro_df.asfreq("B").ffill()
-
-    # ------------------------
-    # Cross-Asset + Correlations
-    # ------------------------
-    cross_asset = _build_cross_asset(market_df, macro_daily)
+def _encode_build(version, force_refresh=False) -> EncodedSnapshot:
+    payload = build_overview_snapshot(force_refresh=force_refresh, data_version=version)
+    if payload["build"]["degraded"]:
+        # No version: never persisted, and revalidation retries it with
+        # backoff instead of keeping the partial payload until new data arrives.
+        return encode_snapshot(payload, None, time.time())
+
+    snapshot = encode_snapshot(payload, version, time.time())
+    try:
+        save_snapshot(snapshot)
+    except Exception as exc:
+        print(f"Could not persist overview snapshot {version}: {exc}")
+    return snapshot
+
+
+def _store_snapshot(version, force_refresh=False):
+    global _snapshot, _last_check
+    snapshot = None if force_refresh else load_snapshot(version)
+    if snapshot is None:
+        snapshot = _encode_build(version, force_refresh=force_refresh)
+    _snapshot = snapshot
+    _last_check = time.monotonic()
+
+    if snapshot.data_version is not None:
+        _degraded.update(version=None, delay=0.0, retry_at=0.0)
+    else:
+        retried = _degraded["version"] == version
+        delay = min(_degraded["delay"] * 2, DEGRADED_RETRY_MAX_SECONDS) if retried else DEGRADED_RETRY_SECONDS
+        _degraded.update(version=version, delay=delay, retry_at=_last_check + delay)
+        print(f"Overview snapshot degraded; retrying in {delay:.0f}s unless the data changes")
+
+
+def _degraded_backoff(version) -> bool:
+    """Whether the served degraded snapshot for version should not be retried yet."""
+    return (
+        _snapshot is not None
+        and _snapshot.data_version is None
+        and _degraded["version"] == version
+        and time.monotonic() < _degraded["retry_at"]
+    )
+
+
+def _revalidate():
+    """Background refresh: load or rebuild only if the data version moved (or a degraded build is due a retry)."""
+    global _last_check
+    try:
+        version = current_data_version()
+        if _degraded_backoff(version):
+            _last_check = time.monotonic()
+        elif _snapshot is None or _snapshot.data_version != version:
+            _store_snapshot(version)
+        else:
+            _last_check = time.monotonic()
+    except Exception as exc:
+        print(f"Overview revalidation failed: {exc}")
+    finally:
+        _refresh_lock.release()
+
+
+def _build_inline(force_refresh):
+    with _refresh_lock:
+        if force_refresh or _snapshot is None:
+            _store_snapshot(current_data_version(), force_refresh=force_refresh)
+
+
+def refresh_overview_snapshot() -> int:
+    """
+    Build and persist the snapshot for the current data version.
+
+    Run at the end of each ingestion, so API workers pick up the stored
+    bytes on their next revalidation instead of building. Returns the
+    encoded size in bytes.
+    """
+    with _refresh_lock:
+        _store_snapshot(current_data_version())
+        return len(_snapshot.body)
+
+
+def get_overview_snapshot(force_refresh=False) -> tuple[EncodedSnapshot, float]:
+    """
+    Serve the last overview snapshot immediately (stale-while-revalidate).
+
+    Only the first call in a process, or force_refresh, loads or builds
+    inline; after that a revalidation is started in the background when the
+    last check is older than REVALIDATE_INTERVAL_SECONDS. Returns the
+    pre-encoded snapshot and its age in seconds.
+    """
+    if force_refresh or _snapshot is None:
+        single_flight(
+            f"overview_snapshot:force_refresh={force_refresh}",
+            lambda: _build_inline(force_refresh),
+        )
+    elif time.monotonic() - _last_check >= REVALIDATE_INTERVAL_SECONDS:
+        if _refresh_lock.acquire(blocking=False):
+            threading.Thread(target=_revalidate, name="overview-revalidate", daemon=True).start()
+
+    snapshot = _snapshot
+    return snapshot, max(0.0, time.time() - snapshot.built_at)
+
+
+def build_overview_snapshot(force_refresh=False, data_version=None):
+    """
+    Overview payload, rebuilt only when an ingestion run changed the data (or on force_refresh).
+
+    The data version is resolved once, here or by the caller, and handed to
+    every memoized step of the build.
+    """
+    if data_version is None:
+        data_version = current_data_version()
+    if force_refresh:
+        # Also the memoized frames the sections read, or a forced rebuild
+        # could reassemble them unchanged.
+        from correlation_service import build_correlations
+        _cached_overview_snapshot.cache_clear()
+        generate_sentiment_series.cache_clear()
+        build_correlations.cache_clear()
+    payload = _cached_overview_snapshot(data_version, data_version=data_version)
+    if payload["build"]["degraded"]:
+        _cached_overview_snapshot.cache_clear()
+    return payload
+
+
+@memoize_on_data_version()
+def _cached_overview_snapshot(version):
+    return _build_snapshot(load_overview_data(version))
+
+
+def _section_cross_asset(data: OverviewData, done: dict) -> list:
+    return _build_cross_asset(data.market, data.macro_daily, data.stored_closes)
+
+
+def _section_correlations(data: OverviewData, done: dict) -> list:
     from correlation_service import build_correlations
-    correlations = build_correlations(market_df, macro_daily)
+    return build_correlations(data.market, data.macro_daily, data.returns, data_version=data.data_version)
+
 
+def _section_regime(data: OverviewData, done: dict) -> dict:
     # Regime classification (uses correlations + VIX + sector dispersion)
     from regime_service import classify_regime
-    regime = classify_regime(market_df, macro_daily, correlations)
+    return classify_regime(data.market, data.macro_daily, done["correlations"])
 
-    # ------------------------
-    # Market Cards
-    # ------------------------
+
+def _section_market_cards(data: OverviewData, done: dict) -> list:
+    market_df = data.market
     cards = []
     for sym, name in CARD_ASSETS:
         if sym not in market_df.columns:
@@ -339,8 +511,8 @@ def build_overview_snapshot(force_refresh=False):
         })
 
     # Add US 10Y
-    if "ten_year_yield" in macro_daily.columns:
-        t = macro_daily["ten_year_yield"]
+    if "ten_year_yield" in data.macro_daily.columns:
+        t = data.macro_daily["ten_year_yield"]
         cards.append({
             "symbol": "dgs10",
             "name": "US 10Y Yield",
@@ -351,13 +523,12 @@ def build_overview_snapshot(force_refresh=False):
             "change_1y": _pct_change(t, 252),
             "sparkline": _sparkline(t, 30),
         })
+    return cards
 
-    # ------------------------
-    # Sentiment + Drivers
-    # ------------------------
-    sentiment_series, group_scores = generate_sentiment_series()
+
+def _section_sentiment(data: OverviewData, done: dict) -> dict:
+    sentiment_series, group_scores = generate_sentiment_series(data.market, data.returns, data_version=data.data_version)
     score = float(sentiment_series.iloc[-1])
-    risk_label = _classify_risk(score)
     drivers = []
     if isinstance(group_scores, pd.DataFrame):
         row = group_scores.iloc[-1]
@@ -366,13 +537,19 @@ def build_overview_snapshot(force_refresh=False):
             arrow = "↑" if row[g] > 0 else "↓" if row[g] < 0 else "→"
             drivers.append(f"{g.capitalize()} {arrow}")
 
-    # ------------------------
-    # Macro chips
-    # ------------------------
-    latest = macro_df.iloc[-1]
-    prev = macro_df.iloc[-2] if macro_df.shape[0] >= 2 else latest
+    return {
+        "score": score,
+        "label": _classify_risk(score),
+        "drivers": drivers,
+        "equity_trend": _classify_equity_trend(data.market.get("sp500")),
+    }
+
 
-    macro_out = {
+def _section_macro(data: OverviewData, done: dict) -> dict:
+    latest = data.macro.iloc[-1]
+    prev = data.macro.iloc[-2] if data.macro.shape[0] >= 2 else latest
+
+    return {
         "cpi": {
             "value": latest.get("cpi"),
             "prev": prev.get("cpi"),
@@ -390,80 +567,118 @@ def build_overview_snapshot(force_refresh=False):
         },
     }
 
-    # ------------------------
-    # Regions
-    # ------------------------
-    regions = []
-    for region_name, sym in REGION_TILES:
-        if sym in market_df.columns:
-            regions.append({
-                "region": region_name,
-                "symbol": sym,
-                "change_1m": _pct_change(market_df[sym], 21),
-            })
 
-    # ------------------------
-    # Sectors
-    # ------------------------
-    sectors = []
-    for sym, label in SECTOR_MAP.items():
-        if sym in market_df.columns:
-            sectors.append({
-                "sector": label,
-                "symbol": sym,
-                "change_1m": _pct_change(market_df[sym], 21),
-            })
+def _section_regions(data: OverviewData, done: dict) -> list:
+    return [
+        {"region": region_name, "symbol": sym, "change_1m": _pct_change(data.market[sym], 21)}
+        for region_name, sym in REGION_TILES
+        if sym in data.market.columns
+    ]
+
+
+def _section_sectors(data: OverviewData, done: dict) -> list:
+    return [
+        {"sector": label, "symbol": sym, "change_1m": _pct_change(data.market[sym], 21)}
+        for sym, label in SECTOR_MAP.items()
+        if sym in data.market.columns
+    ]
 
-    # ------------------------
-    # Yield panel
-    # ------------------------
-    ten = macro_daily["ten_year_yield"].iloc[-1]
-    two = macro_daily["two_year_yield"].iloc[-1]
+
+def _section_yield(data: OverviewData, done: dict) -> dict:
+    ten = data.macro_daily["ten_year_yield"].iloc[-1]
+    two = data.macro_daily["two_year_yield"].iloc[-1]
     slope_bps = (ten - two) * 100
-    slope_label = "Inverted" if slope_bps < 0 else "Normal"
+    return {
+        "ten_year": ten,
+        "two_ten_slope_bps": slope_bps,
+        "slope_label": "Inverted" if slope_bps < 0 else "Normal",
+    }
+
 
-    # ------------------------
-    # Narrative
-    # ------------------------
-    spx1d = _pct_change(market_df.get("sp500"), 1)
-    dxy1d = _pct_change(market_df.get("usd_index"), 1)
+def _section_narrative(data: OverviewData, done: dict) -> str:
+    spx1d = _pct_change(data.market.get("sp500"), 1)
+    dxy1d = _pct_change(data.market.get("usd_index"), 1)
 
+    ten_year = data.macro_daily["ten_year_yield"]
     ten1d = np.nan
-    if macro_daily["ten_year_yield"].dropna().shape[0] > 1:
-        ten1d = (macro_daily["ten_year_yield"].iloc[-1] -
-                 macro_daily["ten_year_yield"].iloc[-2]) * 100
-
-    narrative = _narrative(spx1d, dxy1d, ten1d, risk_label)
-
-    # ------------------------
-    # Payload
-    # ------------------------
-    payload = {
-        "sentiment": {
-            "score": score,
-            "label": risk_label,
-            "drivers": drivers,
-            "equity_trend": _classify_equity_trend(market_df.get("sp500")),
-        },
-        "market_cards": cards,
-        "macro": macro_out,
-        "regions": regions,
-        "sectors": sectors,
-        "yield": {
-            "ten_year": ten,
-            "two_ten_slope_bps": slope_bps,
-            "slope_label": slope_label,
-        },
-        "narrative": narrative,
-        "cross_asset": cross_asset,
-        "correlations": correlations,
-        "regime": regime,
-        "last_updated": pd.Timestamp.utcnow().isoformat(),
-    }
+    if ten_year.dropna().shape[0] > 1:
+        ten1d = (ten_year.iloc[-1] - ten_year.iloc[-2]) * 100
+
+    return _narrative(spx1d, dxy1d, ten1d, done["sentiment"]["label"])
+
 
-    # sanitize to avoid JSON crash
-    payload = sanitize(payload)
+# Fallbacks keep each section's shape with null values, so clients that read
+# fields of a section do not have to special-case a failed build.
+_EMPTY_SENTIMENT = {"score": None, "label": None, "drivers": [], "equity_trend": None}
+_EMPTY_MACRO = {
+    key: {"value": None, "prev": None, "direction": None}
+    for key in ("cpi", "unemployment", "policy_rate")
+}
+_EMPTY_YIELD = {"ten_year": None, "two_ten_slope_bps": None, "slope_label": None}
+_EMPTY_REGIME = {"regime": None, "confidence": None, "description": "", "signals": {}}
+
+# (payload key, section builder, sections it depends on, value if it fails).
+# Builders get the shared OverviewData and the finished upstream values;
+# independent sections run concurrently. Order here is payload order.
+OVERVIEW_SECTIONS = (
+    ("sentiment", _section_sentiment, (), _EMPTY_SENTIMENT),
+    ("market_cards", _section_market_cards, (), []),
+    ("macro", _section_macro, (), _EMPTY_MACRO),
+    ("regions", _section_regions, (), []),
+    ("sectors", _section_sectors, (), []),
+    ("yield", _section_yield, (), _EMPTY_YIELD),
+    ("narrative", _section_narrative, ("sentiment",), ""),
+    ("cross_asset", _section_cross_asset, (), []),
+    ("correlations", _section_correlations, (), []),
+    ("regime", _section_regime, ("correlations",), _EMPTY_REGIME),
+)
+
+SECTION_WORKERS = int(os.getenv("OVERVIEW_SECTION_WORKERS", "4"))
+
+
+def _build_snapshot(data: OverviewData) -> dict:
+    """
+    Assemble the payload from OVERVIEW_SECTIONS on a thread pool.
+
+    A section that fails (or depends on one that failed) gets its fallback
+    value and is listed under build.degraded instead of failing the build.
+    build.sections records each section's status and duration.
+    """
+    done = {}
+
+    def _task(name, builder):
+        def run():
+            done[name] = builder(data, done)
+            return done[name]
+        return run
+
+    started = time.perf_counter()
+    results = run_task_graph(
+        [(name, _task(name, builder), deps) for name, builder, deps, _ in OVERVIEW_SECTIONS],
+        max_workers=SECTION_WORKERS,
+    )
+    elapsed = time.perf_counter() - started
+
+    payload = {}
+    sections = {}
+    degraded = []
+    for name, _, _, fallback in OVERVIEW_SECTIONS:
+        result = results[name]
+        sections[name] = {"status": result.status, "ms": round(result.seconds * 1000, 2)}
+        if result.status == "success":
+            payload[name] = result.value
+        else:
+            print(f"Overview section '{name}' {result.status}: {result.error}")
+            sections[name]["error"] = result.error
+            payload[name] = fallback
+            degraded.append(name)
+
+    payload["last_updated"] = pd.Timestamp.utcnow().isoformat()
+    payload["build"] = {
+        "ms": round(elapsed * 1000, 2),
+        "sections": sections,
+        "degraded": degraded,
+    }
 
-    _CACHE["ts"] = now
-    _CACHE["data"] = payload
+    # NaN/inf and NumPy values are handled when the snapshot is encoded.
     return payload
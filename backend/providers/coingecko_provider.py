@@ -25,6 +25,20 @@ def _utc_now_naive():
     return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
+def _observation_time(coin, fallback):
+    """CoinGecko's last_updated (ISO-8601, UTC) as a naive datetime."""
+    last_updated = coin.get("last_updated")
+    if not last_updated:
+        return fallback
+
+    try:
+        parsed = datetime.fromisoformat(last_updated.replace("Z", "+00:00"))
+    except ValueError:
+        return fallback
+
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 def fetch_crypto_quotes():
     load_dotenv()
 
@@ -61,7 +75,7 @@ def fetch_crypto_quotes():
             {
                 "symbol": coin.get("symbol", "").upper(),
                 "name": coin.get("name"),
-                "timestamp": timestamp,
+                "timestamp": _observation_time(coin, timestamp),
                 "price": coin.get("current_price"),
                 "market_cap": coin.get("market_cap"),
                 "volume_24h": coin.get("total_volume"),
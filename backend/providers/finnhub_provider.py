@@ -1,11 +1,17 @@
 """Finnhub data provider for current equity and ETF quotes."""
 
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from providers.rate_limit import TokenBucket
 from schemas.source_types import FINNHUB
 
 
@@ -25,49 +31,118 @@ FINNHUB_SYMBOLS = [
 FINNHUB_QUOTE_URL = "https://finnhub.io/api/v1/quote"
 REQUEST_TIMEOUT_SECONDS = 15
 
+# Free-tier quota is 60 calls/minute. A full bucket plus one minute of refill
+# must fit in that quota, so the refill rate is the quota minus the burst.
+FINNHUB_CALLS_PER_MINUTE = 60
+FINNHUB_BURST = 10
+MAX_WORKERS = 8
+# 429s are retried here, through the limiter, rather than by urllib3.
+RATE_LIMIT_RETRIES = 2
 
-def _utc_now_naive():
-    return datetime.now(timezone.utc).replace(tzinfo=None)
+_rate_limiter = TokenBucket(FINNHUB_CALLS_PER_MINUTE - FINNHUB_BURST, capacity=FINNHUB_BURST)
+_session = None
+_session_lock = threading.Lock()
 
 
-def fetch_equity_quotes():
+def _get_session():
+    """Return a process-wide keep-alive session sized for the worker pool."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=2,
+                backoff_factor=0.5,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=("GET",),
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def _fetch_quote(session, symbol, api_key):
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        _rate_limiter.acquire()
+        response = session.get(
+            FINNHUB_QUOTE_URL,
+            params={"symbol": symbol},
+            # Header auth keeps the token out of URLs echoed in error messages.
+            headers={"X-Finnhub-Token": api_key},
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+        if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            break
+        print(f"Finnhub rate limited {symbol}; retrying")
+    response.raise_for_status()
+    quote = response.json()
+
+    # Unknown symbols come back as HTTP 200 with an all-zero payload.
+    if not quote or not quote.get("t"):
+        raise RuntimeError("empty quote")
+
+    return {
+        "symbol": symbol,
+        # Quote time reported by Finnhub, not fetch time, so re-fetching an
+        # unchanged quote maps onto the same (symbol, timestamp) row.
+        "timestamp": datetime.fromtimestamp(quote["t"], timezone.utc).replace(tzinfo=None),
+        "price": quote.get("c"),
+        "change": quote.get("d"),
+        "percent_change": quote.get("dp"),
+        "high": quote.get("h"),
+        "low": quote.get("l"),
+        "open": quote.get("o"),
+        "previous_close": quote.get("pc"),
+        "volume": None,
+        "source": FINNHUB,
+    }
+
+
+def fetch_equity_quote_batch(symbols=None, max_workers=MAX_WORKERS):
+    """
+    Fetch quotes for symbols concurrently over a pooled session.
+
+    Returns (rows, failures) where failures maps symbol -> error message.
+    A failing symbol never aborts the rest of the batch.
+    """
     load_dotenv()
 
     api_key = os.getenv("FINNHUB_API_KEY")
     if not api_key:
         raise RuntimeError("FINNHUB_API_KEY is missing from environment")
 
-    timestamp = _utc_now_naive()
-    rows = []
+    symbols = list(symbols or FINNHUB_SYMBOLS)
+    session = _get_session()
+    results = {}
+    failures = {}
 
-    for symbol in FINNHUB_SYMBOLS:
-        params = {
-            "symbol": symbol,
-            "token": api_key,
+    batch_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols)) or 1) as executor:
+        futures = {
+            executor.submit(_fetch_quote, session, symbol, api_key): symbol
+            for symbol in symbols
         }
-        response = requests.get(
-            FINNHUB_QUOTE_URL,
-            params=params,
-            timeout=REQUEST_TIMEOUT_SECONDS,
-        )
-        response.raise_for_status()
-        quote = response.json()
-
-        rows.append(
-            {
-                "symbol": symbol,
-                "timestamp": timestamp,
-                "price": quote.get("c"),
-                "change": quote.get("d"),
-                "percent_change": quote.get("dp"),
-                "high": quote.get("h"),
-                "low": quote.get("l"),
-                "open": quote.get("o"),
-                "previous_close": quote.get("pc"),
-                "volume": None,
-                "source": FINNHUB,
-            }
-        )
-        print(f"Loaded Finnhub quote: {symbol}")
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                results[symbol] = future.result()
+                print(f"Loaded Finnhub quote: {symbol}")
+            except Exception as exc:
+                failures[symbol] = str(exc)
+                print(f"Error loading Finnhub quote {symbol}: {exc}")
+
+    elapsed = time.perf_counter() - batch_started
+    print(f"Fetched {len(results)}/{len(symbols)} Finnhub quotes in {elapsed:.2f}s")
+
+    # Keep the configured symbol order regardless of completion order.
+    rows = [results[symbol] for symbol in symbols if symbol in results]
+    return rows, failures
+
+
+def fetch_equity_quotes():
+    rows, failures = fetch_equity_quote_batch()
+    if not rows:
+        raise RuntimeError(f"No Finnhub quotes fetched: {failures}")
 
     return rows
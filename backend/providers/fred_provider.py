@@ -1,5 +1,6 @@
 """FRED provider for macroeconomic data fetch and cleaning."""
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import os
 
@@ -7,11 +8,41 @@ import pandas as pd
 from dotenv import load_dotenv
 from fredapi import Fred
 
+from providers.rate_limit import TokenBucket
 
-def fetch_macro_data():
+
+# --- Add DGS2 and DGS10 for yields ---
+FRED_SERIES = {
+    "CPI": "CPIAUCSL",
+    "Unemployment": "UNRATE",
+    "Fed_Funds_Rate": "FEDFUNDS",
+    "GDP": "GDPC1",
+    "DGS2": "DGS2",
+    "DGS10": "DGS10",
+}
+
+# FRED allows 120 requests/minute per API key.
+FRED_CALLS_PER_MINUTE = 120
+MAX_WORKERS = len(FRED_SERIES)
+
+_rate_limiter = TokenBucket(FRED_CALLS_PER_MINUTE, capacity=MAX_WORKERS)
+
+
+def _load_series(fred, name, code, observation_start):
+    _rate_limiter.acquire()
+    started = time.perf_counter()
+    series = fred.get_series(code, observation_start=observation_start)
+    print(f"Loaded macro: {name} ({len(series)} points, {time.perf_counter() - started:.2f}s)")
+    return series
+
+
+def fetch_macro_data(observation_start=None, max_workers=MAX_WORKERS):
     """
     Fetch key macroeconomic indicators from the Federal Reserve (FRED).
     Returns a pandas DataFrame with monthly/quarterly data.
+
+    Pass observation_start to request only observations on or after that
+    date. Series are loaded in parallel within FRED's rate limit.
     """
     load_dotenv()  # loads .env variables
     FRED_API_KEY = os.getenv("FRED_API_KEY")
@@ -21,31 +52,24 @@ def fetch_macro_data():
 
     fred = Fred(api_key=FRED_API_KEY)
 
-    # --- Add DGS2 and DGS10 for yields ---
-    series = {
-        "CPI": "CPIAUCSL",
-        "Unemployment": "UNRATE",
-        "Fed_Funds_Rate": "FEDFUNDS",
-        "GDP": "GDPC1",
-        "DGS2": "DGS2",
-        "DGS10": "DGS10",
-    }
-
     data = {}
-    for name, code in series.items():
-        try:
-            df = fred.get_series(code)
-            data[name] = df
-            print(f"Loaded macro: {name}")
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"Error loading {name}: {e}")
-
-    missing = [name for name in series if name not in data]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_load_series, fred, name, code, observation_start): name
+            for name, code in FRED_SERIES.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                data[name] = future.result()
+            except Exception as e:
+                print(f"Error loading {name}: {e}")
+
+    missing = [name for name in FRED_SERIES if name not in data]
     if missing:
         raise RuntimeError(f"Missing required FRED series: {', '.join(missing)}")
 
-    macro_df = pd.DataFrame(data)
+    macro_df = pd.DataFrame({name: data[name] for name in FRED_SERIES})
     macro_df.index = pd.to_datetime(macro_df.index)
 
     # Convert yields to float and forward fill missing business days.
@@ -54,4 +78,12 @@ def fetch_macro_data():
 
     macro_df = macro_df.sort_index().ffill().dropna()
 
+    if macro_df.empty and any(len(series) for series in data.values()):
+        # Usually a window too short to hold a print of every series (GDP is quarterly).
+        empty = [name for name in FRED_SERIES if data[name].dropna().empty]
+        print(
+            "FRED returned observations but no complete macro rows"
+            f" (series with no points in window: {', '.join(empty) or 'none'})"
+        )
+
     return macro_df
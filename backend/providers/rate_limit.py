@@ -0,0 +1,41 @@
+"""Thread-safe token-bucket rate limiter shared by provider fetchers."""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute.
+
+    capacity bounds the burst size. acquire() blocks until a token is
+    available, so a pool of worker threads collectively stays within the
+    provider's quota.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate_per_second)
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until tokens are available; return the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate_per_second
+
+            time.sleep(wait)
+            waited += wait
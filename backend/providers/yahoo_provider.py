@@ -1,96 +1,266 @@
 """Yahoo Finance provider for market data fetch and cleaning."""
 
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
 import pandas as pd
 import yfinance as yf
 
 
-def fetch_market_data():
-    tickers = {
-        # --- Equities ---
-        "SP500": "^GSPC",
-        "NASDAQ": "^IXIC",
-        "VGK": "VGK",
-        "EWJ": "EWJ",
-        "EEM": "EEM",
-        "MTUM": "MTUM",
-        "VTV": "VTV",
-        "IWF": "IWF",
-
-        # --- Sector ETFs (NEW) ---
-        "XLY": "XLY",
-        "XLP": "XLP",
-        "XLE": "XLE",
-        "XLF": "XLF",
-        "XLV": "XLV",
-        "XLK": "XLK",
-        "XLI": "XLI",
-        "XLB": "XLB",
-        "XLRE": "XLRE",
-        "XLC": "XLC",
-
-        # --- Bonds / Credit ---
-        "IRX": "^IRX",
-        "FVX": "^FVX",
-        "TNX": "^TNX",
-        "HYG": "HYG",
-        "LQD": "LQD",
-        "TLT": "TLT",
-        "VIX": "^VIX",
-
-        # --- Commodities ---
-        "Oil": "CL=F",
-        "NatGas": "NG=F",
-        "Gold": "GC=F",
-        "Silver": "SI=F",
-        "Copper": "HG=F",
-
-        # --- FX ---
-        "USD_Index": "DX-Y.NYB",
-        "EURUSD": "EURUSD=X",
-        "GBPUSD": "GBPUSD=X",
-        "AUDUSD": "AUDUSD=X",
-        "USDJPY": "USDJPY=X",
-        "USDCHF": "USDCHF=X",
-        "CEW": "CEW",
-
-        # --- Crypto ---
-        "Bitcoin": "BTC-USD",
-        "Ethereum": "ETH-USD",
-    }
+TICKERS = {
+    # --- Equities ---
+    "SP500": "^GSPC",
+    "NASDAQ": "^IXIC",
+    "VGK": "VGK",
+    "EWJ": "EWJ",
+    "EEM": "EEM",
+    "MTUM": "MTUM",
+    "VTV": "VTV",
+    "IWF": "IWF",
+    "URTH": "URTH",  # MSCI World; stored in price_bars only (no market_data column)
 
-    end = datetime.now()
-    start = end - timedelta(days=365)
+    # --- Sector ETFs (NEW) ---
+    "XLY": "XLY",
+    "XLP": "XLP",
+    "XLE": "XLE",
+    "XLF": "XLF",
+    "XLV": "XLV",
+    "XLK": "XLK",
+    "XLI": "XLI",
+    "XLB": "XLB",
+    "XLRE": "XLRE",
+    "XLC": "XLC",
+
+    # --- Bonds / Credit ---
+    "IRX": "^IRX",
+    "FVX": "^FVX",
+    "TNX": "^TNX",
+    "HYG": "HYG",
+    "LQD": "LQD",
+    "TLT": "TLT",
+    "VIX": "^VIX",
+
+    # --- Commodities ---
+    "Oil": "CL=F",
+    "NatGas": "NG=F",
+    "Gold": "GC=F",
+    "Silver": "SI=F",
+    "Copper": "HG=F",
+
+    # --- FX ---
+    "USD_Index": "DX-Y.NYB",
+    "EURUSD": "EURUSD=X",
+    "GBPUSD": "GBPUSD=X",
+    "AUDUSD": "AUDUSD=X",
+    "USDJPY": "USDJPY=X",
+    "USDCHF": "USDCHF=X",
+    "CEW": "CEW",
+
+    # --- Crypto ---
+    "Bitcoin": "BTC-USD",
+    "Ethereum": "ETH-USD",
+}
+
+LOOKBACK_DAYS = 365
+MIN_POINTS = 5
+
+# Batched mode: symbols per multi-ticker request, and the size of the thread
+# pool used to retry symbols that came back empty from their chunk.
+BATCH_CHUNK_SIZE = 20
+FALLBACK_MAX_WORKERS = 4
+
+
+OHLCV_FIELDS = {
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Volume": "volume",
+}
+
+
+def _ohlcv_frame(df, symbol):
+    """Extract a clean open/high/low/close/volume frame for one symbol."""
+    if not isinstance(df, pd.DataFrame) or df.empty or "Close" not in df.columns:
+        return None
+
+    fields = {}
+    for field, column in OHLCV_FIELDS.items():
+        if field not in df.columns:
+            continue
+        values = df[field]
+        if isinstance(values, pd.DataFrame):
+            # Multi-ticker (or multi-level single ticker) download: one column per symbol.
+            if symbol not in values.columns:
+                continue
+            values = values[symbol]
+        fields[column] = values
+
+    if "close" not in fields:
+        return None
+
+    frame = pd.DataFrame(fields).reindex(columns=list(OHLCV_FIELDS.values()))
+    return frame.dropna(subset=["close"])
+
+
+def _accept_bars(name, bars, data, min_points):
+    if bars is None or bars.empty:
+        print(f"Skipped {name}: invalid or missing Close column")
+        return False
+
+    if len(bars) <= min_points:
+        print(f"Skipped {name}: not enough data points")
+        return False
+
+    data[name] = bars
+    print(f"Loaded {name} ({len(bars)} points)")
+    return True
+
+
+def _fetch_sequential(tickers, start, end, min_points):
     data = {}
 
     for name, symbol in tickers.items():
         try:
-            df = yf.download(symbol, start=start, end=end, interval="1d")
-
-            # Ensure we have a valid DataFrame and a Close column.
-            if isinstance(df, pd.DataFrame) and "Close" in df.columns and not df["Close"].empty:
-                series = df["Close"].dropna()
-                if len(series) > 5:
-                    data[name] = series
-                    print(f"Loaded {name} ({len(series)} points)")
-                else:
-                    print(f"Skipped {name}: not enough data points")
-            else:
-                print(f"Skipped {name}: invalid or missing Close column")
-
+            df = yf.download(symbol, start=start, end=end, interval="1d", progress=False)
+            _accept_bars(name, _ohlcv_frame(df, symbol), data, min_points)
         except Exception as e:
             print(f"Error loading {name}: {e}")
 
+    return data
+
+
+def _fetch_single(symbol, start, end):
+    # Ticker.history keeps its state on the Ticker object, unlike yf.download
+    # which shares module-level buffers and is unsafe to call from many threads.
+    df = yf.Ticker(symbol).history(start=start, end=end, interval="1d")
+    if isinstance(df, pd.DataFrame) and isinstance(df.index, pd.DatetimeIndex) and df.index.tz is not None:
+        # yf.download returns naive dates; align so the frames can be concatenated.
+        df.index = df.index.tz_localize(None)
+    return _ohlcv_frame(df, symbol)
+
+
+def _fetch_batched(tickers, start, end, chunk_size, max_workers, min_points):
+    names = list(tickers)
+    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+    data = {}
+    failed = []
+
+    for index, chunk in enumerate(chunks, start=1):
+        symbols = [tickers[name] for name in chunk]
+        chunk_started = time.perf_counter()
+
+        try:
+            raw = yf.download(
+                symbols,
+                start=start,
+                end=end,
+                interval="1d",
+                group_by="column",
+                threads=True,
+                progress=False,
+            )
+        except Exception as e:
+            print(f"Error loading chunk {index}/{len(chunks)}: {e}")
+            raw = None
+
+        loaded = 0
+        for name in chunk:
+            bars = _ohlcv_frame(raw, tickers[name])
+            if bars is not None and len(bars) > min_points:
+                data[name] = bars
+                loaded += 1
+            else:
+                failed.append(name)
+
+        elapsed = time.perf_counter() - chunk_started
+        print(f"Chunk {index}/{len(chunks)}: loaded {loaded}/{len(chunk)} symbols in {elapsed:.2f}s")
+
+    if not failed:
+        return data
+
+    fallback_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_fetch_single, tickers[name], start, end): name
+            for name in failed
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                _accept_bars(name, future.result(), data, min_points)
+            except Exception as e:
+                print(f"Error loading {name}: {e}")
+
+    elapsed = time.perf_counter() - fallback_started
+    print(f"Fallback: retried {len(failed)} symbols in {elapsed:.2f}s")
+    return data
+
+
+def fetch_price_history(
+    start: datetime | None = None,
+    batched: bool = True,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    max_workers: int = FALLBACK_MAX_WORKERS,
+) -> dict[str, pd.DataFrame]:
+    """
+    Download daily OHLCV bars for every symbol in TICKERS.
+
+    Returns {TICKERS name: frame with open/high/low/close/volume columns}.
+
+    By default a full LOOKBACK_DAYS window is fetched. Pass start to fetch
+    only newer bars (incremental refresh); the minimum-points guard is then
+    skipped because a short window legitimately has few observations.
+
+    Batched mode pulls the universe in multi-symbol chunks and retries any
+    symbol missing from its chunk on a bounded thread pool. Pass
+    batched=False for the legacy one-request-per-ticker loop.
+    """
+    end = datetime.now()
+    if start is None:
+        start = end - timedelta(days=LOOKBACK_DAYS)
+        min_points = MIN_POINTS
+    else:
+        min_points = 0
+
+    fetch_started = time.perf_counter()
+    if batched:
+        data = _fetch_batched(TICKERS, start, end, chunk_size, max_workers, min_points)
+    else:
+        data = _fetch_sequential(TICKERS, start, end, min_points)
+    print(f"Fetched {len(data)}/{len(TICKERS)} tickers in {time.perf_counter() - fetch_started:.2f}s")
+
     if not data:
         raise RuntimeError("No valid data fetched for any ticker.")
 
-    # Combine all valid Series safely.
-    df = pd.concat(data, axis=1, sort=False)
-    df.columns = list(data.keys())
+    return {name: data[name] for name in TICKERS if name in data}
+
+
+def closes_frame(history: dict[str, pd.DataFrame], names=None) -> pd.DataFrame:
+    """
+    Combine per-symbol bars into the wide close frame stored in market_data.
+
+    names restricts the columns (defaults to every fetched symbol). Only
+    dates where every selected symbol has a close are kept.
+    """
+    if names is not None:
+        history = {name: bars for name, bars in history.items() if name in names}
+    if not history:
+        raise RuntimeError("No valid data fetched for any ticker.")
+
+    # Combine all valid Series safely, keeping the TICKERS column order.
+    df = pd.concat([bars["close"] for bars in history.values()], axis=1, sort=False)
+    df.columns = list(history)
+    df.sort_index(inplace=True)
     df.dropna(inplace=True)
 
     print(f"\nFinal dataframe shape: {df.shape}")
     print(df.tail())
 
     return df
+
+
+def fetch_market_data(start: datetime | None = None, **kwargs):
+    """Download daily closes for every symbol in TICKERS as one wide frame."""
+    return closes_frame(fetch_price_history(start=start, **kwargs))
@@ -0,0 +1,135 @@
+"""Batched Core writes for ingestion tables (executemany, ON CONFLICT, COPY)."""
+
+import csv
+import io
+
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+BULK_BATCH_SIZE = 1000
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+
+def _batches(rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def _dialect_name(db) -> str:
+    return db.get_bind().dialect.name
+
+
+def _rowcount(result, fallback: int) -> int:
+    # Some drivers report -1 for executemany; fall back to the batch size.
+    return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else fallback
+
+
+def _copy_insert(db, table, rows) -> int:
+    """Stream rows into Postgres with COPY ... FROM STDIN (CSV)."""
+    columns = list(rows[0])
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    sql = f'COPY "{table.name}" ({column_list}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')'
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+
+    dbapi_connection = db.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    return len(rows)
+
+
+def bulk_insert(db, model, rows: list[dict], batch_size: int = BULK_BATCH_SIZE, use_copy: bool = True) -> int:
+    """
+    Insert plain dict rows without building ORM objects.
+
+    On Postgres the rows are streamed with COPY (unless use_copy=False);
+    elsewhere they go through executemany in batches. All rows must share
+    the same keys. The caller owns the transaction.
+    """
+    if not rows:
+        return 0
+
+    table = model.__table__
+    if use_copy and _dialect_name(db) == "postgresql":
+        return _copy_insert(db, table, rows)
+
+    statement = insert(table)
+    for batch in _batches(rows, batch_size):
+        db.execute(statement, batch)
+
+    return len(rows)
+
+
+def bulk_upsert(
+    db,
+    model,
+    rows: list[dict],
+    conflict_columns: list[str],
+    update_columns: list[str] | None = None,
+    batch_size: int = BULK_BATCH_SIZE,
+    touch_columns: list[str] | None = None,
+    order_column: str | None = None,
+) -> int:
+    """
+    INSERT ... ON CONFLICT DO UPDATE in executemany batches.
+
+    conflict_columns must be covered by a unique index. Rows whose values
+    are unchanged are left alone, so the returned count is the number of
+    rows actually inserted or modified (where the driver reports it).
+    touch_columns (e.g. updated_at) are written on update but never count
+    as a change; they default to none and are excluded from update_columns.
+    With order_column, an existing row is only replaced by one whose
+    order_column value is equal or later.
+    """
+    if not rows:
+        return 0
+
+    dialect = _dialect_name(db)
+    dialect_insert = _DIALECT_INSERTS.get(dialect)
+    if dialect_insert is None:
+        raise NotImplementedError(f"bulk_upsert is not supported on {dialect}")
+
+    table = model.__table__
+    touch_columns = list(touch_columns or [])
+    if update_columns is None:
+        update_columns = [
+            column for column in rows[0]
+            if column not in conflict_columns and column not in touch_columns
+        ]
+
+    statement = dialect_insert(table)
+    if update_columns:
+        statement = statement.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={column: statement.excluded[column] for column in update_columns + touch_columns},
+            where=and_(
+                or_(*[
+                    table.c[column].is_distinct_from(statement.excluded[column])
+                    for column in update_columns
+                ]),
+                *([table.c[order_column] <= statement.excluded[order_column]] if order_column else []),
+            ),
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=conflict_columns)
+
+    written = 0
+    for batch in _batches(rows, batch_size):
+        written += _rowcount(db.execute(statement, batch), len(batch))
+
+    return written
@@ -4,22 +4,22 @@ import json
 import math
 import statistics
 from datetime import datetime, time, timedelta, timezone
+from operator import itemgetter
 
-from models import CalculatedMetric, CryptoQuote, MacroData, MarketData
+import numpy as np
+from sqlalchemy import select
 
-
-CALCULATION_VERSION = "v1"
-
-MARKET_ASSETS = {
-    "sp500": "sp500",
-    "nasdaq": "nasdaq",
-    "vix": "vix",
-    "gold": "gold",
-    "usd_index": "usd_index",
-    "bitcoin": "bitcoin",
-    "ethereum": "ethereum",
-    "tlt": "tlt",
-}
+from models import CalculatedMetric, CryptoQuote, LatestCalculatedMetric, MacroData, MarketData
+from services.bulk_writer import bulk_insert, bulk_upsert
+from services.metric_inputs import (
+    changed_metric_names,
+    crypto_input_digests,
+    macro_input_digests,
+    market_input_digests,
+    metric_hashes,
+    save_input_hashes,
+)
+from services.metric_registry import MARKET_ASSETS, METRICS, groups_for
 
 
 def _utc_now_naive():
@@ -37,19 +37,21 @@ def _is_valid_number(value):
     return value is not None and math.isfinite(float(value))
 
 
-def _metric(metric_name, category, timestamp, value, window, source_dependencies):
+def _metric(metric_name, timestamp, value, window=None, source_dependencies=None):
+    """Build a metric row; category, default window, sources and version come from the registry."""
     if not _is_valid_number(value):
         print(f"Skipped metric {metric_name}: invalid value")
         return None
 
+    spec = METRICS[metric_name]
     return {
         "metric_name": metric_name,
-        "category": category,
+        "category": spec.category,
         "timestamp": _as_datetime(timestamp),
         "value": float(value),
-        "window": window,
-        "source_dependencies": json.dumps(source_dependencies),
-        "calculation_version": CALCULATION_VERSION,
+        "window": window or spec.window,
+        "source_dependencies": json.dumps(list(source_dependencies or spec.sources)),
+        "calculation_version": spec.version,
     }
 
 
@@ -101,11 +103,8 @@ def _calculate_macro_metrics(metrics, macro_rows):
             metrics,
             _metric(
                 "yield_curve_slope_10y_2y",
-                "macro",
                 latest_yields.date,
                 latest_yields.ten_year_yield - latest_yields.two_year_yield,
-                "latest",
-                ["macro_data"],
             ),
         )
 
@@ -132,11 +131,8 @@ def _calculate_macro_metrics(metrics, macro_rows):
         metrics,
         _metric(
             "real_rate_proxy",
-            "macro",
             latest_cpi.date,
             latest_cpi.fed_funds_rate - cpi_yoy_percent,
-            "latest",
-            ["macro_data"],
         ),
     )
 
@@ -154,11 +150,8 @@ def _calculate_dxy_return(metrics, market_rows):
         metrics,
         _metric(
             "dxy_1d_return",
-            "fx",
             latest_date,
             _safe_ratio_return(latest_value, previous_value),
-            "1d",
-            ["market_data"],
         ),
     )
 
@@ -172,11 +165,8 @@ def _calculate_btc_eth_ratio(metrics, market_rows, crypto_rows):
             metrics,
             _metric(
                 "btc_eth_ratio",
-                "crypto",
                 max(btc_quote.timestamp, eth_quote.timestamp),
                 float(btc_quote.price) / float(eth_quote.price),
-                "latest",
-                ["crypto_quotes"],
             ),
         )
         return
@@ -190,17 +180,15 @@ def _calculate_btc_eth_ratio(metrics, market_rows, crypto_rows):
         metrics,
         _metric(
             "btc_eth_ratio",
-            "crypto",
             market_crypto.date,
             market_crypto.bitcoin / market_crypto.ethereum,
-            "latest",
-            ["market_data"],
+            source_dependencies=["market_data"],
         ),
     )
 
 
-def _calculate_market_asset_metrics(metrics, market_rows):
-    for metric_name, field in MARKET_ASSETS.items():
+def _calculate_market_asset_metrics(metrics, market_rows, assets=MARKET_ASSETS):
+    for metric_name, field in assets.items():
         series = _market_series(market_rows, field)
         if not series:
             print(f"Skipped market metrics for {metric_name}: no valid observations")
@@ -214,11 +202,8 @@ def _calculate_market_asset_metrics(metrics, market_rows):
                 metrics,
                 _metric(
                     f"{metric_name}_5d_return",
-                    "market",
                     latest_date,
                     _safe_ratio_return(values[-1], values[-6]),
-                    "5d",
-                    ["market_data"],
                 ),
             )
         else:
@@ -233,11 +218,8 @@ def _calculate_market_asset_metrics(metrics, market_rows):
                 metrics,
                 _metric(
                     f"{metric_name}_20d_volatility",
-                    "market",
                     latest_date,
                     statistics.stdev(log_returns) * math.sqrt(252),
-                    "20d",
-                    ["market_data"],
                 ),
             )
         else:
@@ -249,11 +231,8 @@ def _calculate_market_asset_metrics(metrics, market_rows):
                 metrics,
                 _metric(
                     f"{metric_name}_drawdown_from_peak",
-                    "market",
                     latest_date,
                     (latest_value - peak) / peak,
-                    "1y",
-                    ["market_data"],
                 ),
             )
         else:
@@ -276,11 +255,9 @@ def _calculate_market_asset_metrics(metrics, market_rows):
                     metrics,
                     _metric(
                         f"{metric_name}_price_zscore_252d",
-                        "market",
                         latest_date,
                         (latest_value - statistics.mean(zscore_values)) / std_dev,
-                        zscore_window,
-                        ["market_data"],
+                        window=zscore_window,
                     ),
                 )
             else:
@@ -303,52 +280,323 @@ def _calculate_market_asset_metrics(metrics, market_rows):
                 metrics,
                 _metric(
                     f"{metric_name}_{metric_suffix}",
-                    "market",
                     latest_date,
                     (latest_value - moving_average) / moving_average,
-                    f"{window}d",
-                    ["market_data"],
                 ),
             )
 
 
-def calculate_metrics(db) -> tuple[list[dict], int]:
-    market_rows = db.query(MarketData).order_by(MarketData.date).all()
-    macro_rows = db.query(MacroData).order_by(MacroData.date).all()
-    crypto_rows = (
-        db.query(CryptoQuote)
-        .filter(CryptoQuote.symbol.in_(["BTC", "ETH"]))
-        .order_by(CryptoQuote.timestamp)
-        .all()
+def _price_matrix(market_rows, fields):
+    """
+    Build a right-aligned price matrix: column j holds the valid observations
+    of fields[j] in date order, ending on the last row, NaN-padded on top.
+
+    Returns (matrix, valid_counts, last_dates). Right-aligning makes every
+    trailing window (last 6, 21, 50, 200, 252 values) a plain row slice, so
+    each metric is one array operation across all assets. At least 252 rows
+    are kept so every slice exists.
+    """
+    dates = [row.date for row in market_rows]
+    if market_rows:
+        # market_rows are Row tuples from a column select; pick the fields by
+        # position and let NumPy turn missing values (None) into NaN.
+        positions = [market_rows[0]._fields.index(field) for field in fields]
+        values = np.array(list(map(itemgetter(*positions), market_rows)), dtype=float)
+    else:
+        values = np.empty((0, len(fields)))
+    values = values.reshape(len(market_rows), len(fields))
+
+    valid = np.isfinite(values)
+    # Stable sort on the mask moves invalid cells to the top, keeping order.
+    order = np.argsort(valid, axis=0, kind="stable")
+    matrix = np.take_along_axis(values, order, axis=0)
+    matrix[~np.take_along_axis(valid, order, axis=0)] = np.nan
+    counts = valid.sum(axis=0)
+
+    last_dates = [
+        dates[order[-1, j]] if counts[j] else None
+        for j in range(len(fields))
+    ]
+
+    pad = max(0, 252 - matrix.shape[0])
+    if pad:
+        matrix = np.vstack([np.full((pad, len(fields)), np.nan), matrix])
+
+    return matrix, counts, last_dates
+
+
+def _calculate_market_asset_metrics_vectorized(metrics, market_rows, assets=MARKET_ASSETS):
+    """
+    NumPy equivalent of _calculate_market_asset_metrics for every asset at once.
+
+    Produces the same metric dicts in the same order, with values equal to
+    the statistics-module implementation up to floating-point rounding.
+    """
+    names = list(assets)
+    matrix, counts, last_dates = _price_matrix(market_rows, [assets[name] for name in names])
+    last = matrix[-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prev_5 = matrix[-6]
+        return_5d = np.where(prev_5 != 0, last / prev_5 - 1, np.nan)
+
+        vol_window = matrix[-21:]
+        vol_ok = (counts >= 21) & np.all(vol_window > 0, axis=0)
+        log_returns = np.log(vol_window[1:] / vol_window[:-1])
+        volatility = np.std(log_returns, axis=0, ddof=1) * math.sqrt(252)
+
+        peak = np.nanmax(np.where(np.isnan(matrix), -np.inf, matrix), axis=0)
+
+        # Valid values are right-aligned, so the last 252 rows hold either the
+        # full 252d window or, with less history, every available observation.
+        zscore_window = matrix[-252:]
+        zscore_mean = np.nanmean(zscore_window, axis=0)
+        zscore_std = np.nanstd(zscore_window, axis=0, ddof=1)
+        zscore = (last - zscore_mean) / zscore_std
+
+        moving_averages = {window: np.mean(matrix[-window:], axis=0) for window in (50, 200)}
+
+    for j, metric_name in enumerate(names):
+        _emit_asset_metrics(
+            metrics,
+            metric_name,
+            count=int(counts[j]),
+            latest_date=last_dates[j],
+            latest_value=last[j],
+            return_5d=None if np.isnan(return_5d[j]) else return_5d[j],
+            volatility=volatility[j] if vol_ok[j] else None,
+            peak=peak[j],
+            zscore=zscore[j],
+            zscore_std=zscore_std[j],
+            moving_averages={window: values[j] for window, values in moving_averages.items()},
+        )
+
+
+def _emit_asset_metrics(
+    metrics,
+    metric_name,
+    count,
+    latest_date,
+    latest_value,
+    return_5d,
+    volatility,
+    peak,
+    zscore,
+    zscore_std,
+    moving_averages,
+):
+    """
+    Append one asset's market metrics from precomputed window statistics.
+
+    Shared by the vectorized and rolling-state engines so both emit the
+    same names, windows, order and skip messages as the reference loop.
+    volatility is None when the last 21 prices are not all positive.
+    """
+    if count == 0:
+        print(f"Skipped market metrics for {metric_name}: no valid observations")
+        return
+
+    if count >= 6:
+        _add_metric(
+            metrics,
+            _metric(
+                f"{metric_name}_5d_return",
+                latest_date,
+                return_5d,
+            ),
+        )
+    else:
+        print(f"Skipped metric {metric_name}_5d_return: fewer than 6 observations")
+
+    if count >= 21 and volatility is not None:
+        _add_metric(
+            metrics,
+            _metric(
+                f"{metric_name}_20d_volatility",
+                latest_date,
+                volatility,
+            ),
+        )
+    else:
+        print(f"Skipped metric {metric_name}_20d_volatility: insufficient positive history")
+
+    if peak != 0:
+        _add_metric(
+            metrics,
+            _metric(
+                f"{metric_name}_drawdown_from_peak",
+                latest_date,
+                (latest_value - peak) / peak,
+            ),
+        )
+    else:
+        print(f"Skipped metric {metric_name}_drawdown_from_peak: peak is zero")
+
+    if count >= 60:
+        if zscore_std != 0:
+            _add_metric(
+                metrics,
+                _metric(
+                    f"{metric_name}_price_zscore_252d",
+                    latest_date,
+                    zscore,
+                    window="252d" if count >= 252 else "available_history",
+                ),
+            )
+        else:
+            print(f"Skipped metric {metric_name}_price_zscore_252d: standard deviation is zero")
+    else:
+        print(f"Skipped metric {metric_name}_price_zscore_252d: fewer than 60 observations")
+
+    for window in (50, 200):
+        metric_suffix = f"ma_distance_{window}d"
+        if count < window:
+            print(f"Skipped metric {metric_name}_{metric_suffix}: fewer than {window} observations")
+            continue
+
+        moving_average = moving_averages[window]
+        if moving_average == 0:
+            print(f"Skipped metric {metric_name}_{metric_suffix}: moving average is zero")
+            continue
+
+        _add_metric(
+            metrics,
+            _metric(
+                f"{metric_name}_{metric_suffix}",
+                latest_date,
+                (latest_value - moving_average) / moving_average,
+            ),
+        )
+
+
+def _select_rows(db, model, *criteria, order_by):
+    """Load plain Row tuples (attribute access, no ORM identity map)."""
+    columns = [column for column in model.__table__.columns if column.name != "id"]
+    query = select(*columns).where(*criteria).order_by(order_by)
+    return db.execute(query).all()
+
+
+def _load_metric_inputs(db):
+    market_rows = _select_rows(db, MarketData, order_by=MarketData.date)
+    macro_rows = _select_rows(db, MacroData, order_by=MacroData.date)
+    crypto_rows = _select_rows(
+        db,
+        CryptoQuote,
+        CryptoQuote.symbol.in_(["BTC", "ETH"]),
+        order_by=CryptoQuote.timestamp,
     )
+    return market_rows, macro_rows, crypto_rows
 
-    rows_inspected = len(market_rows) + len(macro_rows) + len(crypto_rows)
+
+def _input_hashes(market_rows, macro_rows, crypto_rows) -> dict[str, str]:
+    digests = market_input_digests(market_rows, MARKET_ASSETS.values())
+    digests.update(macro_input_digests(macro_rows))
+    digests.update(crypto_input_digests(crypto_rows, market_rows))
+    return metric_hashes(digests)
+
+
+def _compute_metrics(market_rows, macro_rows, crypto_rows, vectorized=True, groups=None):
+    """Compute every metric, or only those in the given registry groups."""
     metrics = []
 
-    _calculate_macro_metrics(metrics, macro_rows)
-    _calculate_dxy_return(metrics, market_rows)
-    _calculate_btc_eth_ratio(metrics, market_rows, crypto_rows)
-    _calculate_market_asset_metrics(metrics, market_rows)
+    if groups is None or "macro" in groups:
+        _calculate_macro_metrics(metrics, macro_rows)
+    if groups is None or "dxy" in groups:
+        _calculate_dxy_return(metrics, market_rows)
+    if groups is None or "btc_eth" in groups:
+        _calculate_btc_eth_ratio(metrics, market_rows, crypto_rows)
+
+    assets = {name: field for name, field in MARKET_ASSETS.items() if groups is None or name in groups}
+    if assets:
+        if vectorized:
+            _calculate_market_asset_metrics_vectorized(metrics, market_rows, assets)
+        else:
+            _calculate_market_asset_metrics(metrics, market_rows, assets)
+
+    return metrics
+
+
+def calculate_metrics(db, vectorized: bool = True) -> tuple[list[dict], int]:
+    """
+    Compute the latest value of every calculated metric.
+
+    vectorized=False runs the original per-asset Python loop, kept as the
+    reference implementation for parity checks.
+    """
+    market_rows, macro_rows, crypto_rows = _load_metric_inputs(db)
+    rows_inspected = len(market_rows) + len(macro_rows) + len(crypto_rows)
 
+    metrics = _compute_metrics(market_rows, macro_rows, crypto_rows, vectorized=vectorized)
     return metrics, rows_inspected
 
 
+def select_changed_metrics(db, hashes: dict[str, str], skip_unchanged: bool = True) -> set[str]:
+    """Names to recompute: those whose input hash changed, or all when skip_unchanged=False."""
+    if not skip_unchanged:
+        return set(hashes)
+
+    changed = changed_metric_names(db, hashes)
+    if len(changed) < len(hashes):
+        print(f"Skipping {len(hashes) - len(changed)} calculated metrics with unchanged inputs.")
+    return changed
+
+
+LATEST_METRIC_COLUMNS = (
+    "metric_name",
+    "category",
+    "timestamp",
+    "value",
+    "window",
+    "source_dependencies",
+    "calculation_version",
+    "updated_at",
+)
+
+
+def upsert_latest_metrics(db, rows: list[dict]) -> int:
+    """
+    Fold calculated_metrics rows just inserted into latest_calculated_metrics.
+
+    Keeps the newest timestamp per metric; on a tie the later insert wins,
+    matching the highest-id rule of the history table. The caller commits,
+    so both tables change in one transaction.
+    """
+    latest = {}
+    for row in rows:
+        current = latest.get(row["metric_name"])
+        if current is None or row["timestamp"] >= current["timestamp"]:
+            latest[row["metric_name"]] = row
+
+    records = [{column: row[column] for column in LATEST_METRIC_COLUMNS} for row in latest.values()]
+    return bulk_upsert(
+        db,
+        LatestCalculatedMetric,
+        records,
+        ["metric_name"],
+        touch_columns=["updated_at"],
+        order_column="timestamp",
+    )
+
+
 def save_calculated_metrics(db, metrics: list[dict]) -> int:
     timestamp = _utc_now_naive()
 
-    for metric in metrics:
-        row = CalculatedMetric(
-            metric_name=metric["metric_name"],
-            category=metric["category"],
-            timestamp=metric["timestamp"],
-            value=metric["value"],
-            window=metric["window"],
-            source_dependencies=metric["source_dependencies"],
-            calculation_version=metric["calculation_version"],
-            created_at=timestamp,
-            updated_at=timestamp,
-        )
-        db.add(row)
+    rows = [
+        {
+            "metric_name": metric["metric_name"],
+            "category": metric["category"],
+            "timestamp": metric["timestamp"],
+            "value": metric["value"],
+            "window": metric["window"],
+            "source_dependencies": metric["source_dependencies"],
+            "calculation_version": metric["calculation_version"],
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        }
+        for metric in metrics
+    ]
+    bulk_insert(db, CalculatedMetric, rows)
+    upsert_latest_metrics(db, rows)
 
     db.commit()
     rows_written = len(metrics)
@@ -356,8 +604,37 @@ def save_calculated_metrics(db, metrics: list[dict]) -> int:
     return rows_written
 
 
-def refresh_calculated_metrics(db) -> tuple[int, int]:
-    metrics, rows_inspected = calculate_metrics(db)
+def refresh_calculated_metrics(
+    db,
+    incremental: bool = False,
+    skip_unchanged: bool = True,
+) -> tuple[int, int]:
+    """
+    Compute and store the latest calculated metrics.
+
+    incremental=True updates persisted rolling state with new bars only
+    (see services.rolling_metrics) instead of reloading every table.
+    skip_unchanged=True recomputes and rewrites only metrics whose input
+    hash differs from the one stored at their last refresh.
+    """
+    if incremental:
+        from services.rolling_metrics import calculate_metrics_incremental, save_rolling_states
+
+        metrics, rows_inspected, states, hashes = calculate_metrics_incremental(
+            db, skip_unchanged=skip_unchanged,
+        )
+        save_rolling_states(db, states)
+    else:
+        market_rows, macro_rows, crypto_rows = _load_metric_inputs(db)
+        rows_inspected = len(market_rows) + len(macro_rows) + len(crypto_rows)
+
+        hashes = _input_hashes(market_rows, macro_rows, crypto_rows)
+        changed = select_changed_metrics(db, hashes, skip_unchanged)
+        metrics = _compute_metrics(market_rows, macro_rows, crypto_rows, groups=groups_for(changed))
+        metrics = [metric for metric in metrics if metric["metric_name"] in changed]
+        hashes = {name: value for name, value in hashes.items() if name in changed}
+
+    save_input_hashes(db, hashes, _utc_now_naive())
     rows_written = save_calculated_metrics(db, metrics)
 
     return rows_written, rows_inspected
@@ -0,0 +1,90 @@
+"""Global data version derived from ingestion runs, and memoization keyed on it."""
+
+import functools
+import threading
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from db import SessionLocal
+from models import IngestionRun
+
+
+def current_data_version(db=None) -> int:
+    """
+    Id of the newest successful ingestion run that wrote rows, or 0.
+
+    Every run that changes stored data moves it forward, so anything derived
+    from the database stays valid until it changes. Runs that wrote nothing
+    (an unchanged refresh) leave it alone.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        version = db.execute(
+            select(func.max(IngestionRun.id))
+            .where(IngestionRun.status == "success", IngestionRun.rows_written > 0)
+        ).scalar()
+    finally:
+        if own_session:
+            db.close()
+
+    return version or 0
+
+
+def memoize_on_data_version(key=None):
+    """
+    Cache a function's result until the data version changes.
+
+    key(*args, **kwargs), when given, returns an extra hashable cache key
+    for arguments that change the result. All entries are dropped when the
+    version moves. Cached results are shared between callers and must be
+    treated as read-only. The wrapper exposes cache_clear().
+
+    Callers that already resolved the version can pass it as the keyword
+    data_version, which is not forwarded to the function; otherwise each
+    call reads it from the database.
+    """
+    def decorator(fn):
+        state = {"version": None, "entries": {}}
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args, data_version=None, **kwargs):
+            version = data_version if data_version is not None else current_data_version()
+            cache_key = key(*args, **kwargs) if key is not None else None
+
+            with lock:
+                if state["version"] != version:
+                    state["version"] = version
+                    state["entries"] = {}
+                elif cache_key in state["entries"]:
+                    return state["entries"][cache_key]
+
+            result = fn(*args, **kwargs)
+
+            with lock:
+                # An ingestion that finished mid-build leaves this result
+                # under the old version, so the next call recomputes.
+                if state["version"] == version:
+                    state["entries"][cache_key] = result
+            return result
+
+        def cache_clear():
+            with lock:
+                state["version"] = None
+                state["entries"] = {}
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+def frame_key(df) -> tuple:
+    """Identity for a history frame: its columns, length and a hash of index and values."""
+    if df is None:
+        return (None,)
+    return (tuple(df.columns), len(df), int(pd.util.hash_pandas_object(df).sum()))
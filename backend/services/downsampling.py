@@ -0,0 +1,44 @@
+"""Downsampling of long series for charts."""
+
+import numpy as np
+
+
+def lttb(x, y, threshold: int) -> np.ndarray:
+    """
+    Indices kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept. The points between them are
+    split into threshold - 2 buckets. From each bucket, the kept point forms
+    the largest triangle with the previously kept point and the average of
+    the next bucket. This keeps peaks and troughs that plain striding would
+    drop. x must be increasing. Returns every index when the series already
+    has threshold points or fewer.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # Twice the triangle area; the constant factor does not change the argmax.
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+
+    return kept
@@ -0,0 +1,191 @@
+"""Memory-mapped Arrow IPC cache of the market_data and macro_data history tables."""
+
+import os
+import tempfile
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ModuleNotFoundError:  # optional: without pyarrow every read goes to the database
+    pa = None
+    ipc = None
+
+
+CACHE_DIR = os.getenv(
+    "HISTORY_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+
+CACHED_TABLES = ("market_data", "macro_data")
+
+# Ingestion job that rewrites each cached table; its latest run is part of the stamp.
+CACHE_JOBS = {"market_data": "market_data_refresh", "macro_data": "macro_data_refresh"}
+
+READ_CHUNK_ROWS = 2000
+
+# Schema metadata key holding the stamp of the data a cache file was built from.
+STAMP_KEY = b"insightpulse.stamp"
+
+
+def cache_enabled() -> bool:
+    return pa is not None
+
+
+def cache_path(table: str) -> str:
+    return os.path.join(CACHE_DIR, f"{table}.arrow")
+
+
+def history_stamp(table: str, bind) -> str:
+    """
+    Identity of the database contents a cache file for table is built from.
+
+    Combines the database URL, the table's row count, latest date and
+    highest id, and the latest successful ingestion run for the table. A file
+    written from another database, before a later ingestion (on any host),
+    or before rows were inserted or removed outside ingestion no longer
+    matches, and is rebuilt instead of served.
+    """
+    query = text(
+        f"SELECT COUNT(*), MAX(date), MAX(id), "
+        f"(SELECT MAX(id) FROM ingestion_runs WHERE job_name = :job AND status = 'success') "
+        f"FROM {table}"
+    )
+    params = {"job": CACHE_JOBS.get(table, "")}
+    if isinstance(bind, Engine):
+        with bind.connect() as connection:
+            row = connection.execute(query, params).one()
+    else:
+        row = bind.execute(query, params).one()
+
+    url = bind.engine.url.render_as_string(hide_password=True)
+    return "|".join([url, *(str(value) for value in row)])
+
+
+def write_history_cache(table: str, df: pd.DataFrame, stamp: str | None = None) -> bool:
+    """
+    Atomically replace the cache file for table with df (date-indexed).
+
+    Written to a temporary file and renamed over the old one, so readers
+    never see a partial file. stamp (see history_stamp) is stored with the
+    file. Returns False if the cache is unavailable.
+    """
+    if not cache_enabled():
+        return False
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(table)
+    # A unique name per writer, so concurrent refreshes never share a temp file.
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f"{table}.", suffix=".tmp")
+    os.close(fd)
+
+    try:
+        arrow_table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+        if stamp is not None:
+            metadata = dict(arrow_table.schema.metadata or {})
+            metadata[STAMP_KEY] = stamp.encode()
+            arrow_table = arrow_table.replace_schema_metadata(metadata)
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        # mkstemp creates the file owner-only; the cache is meant to be shared.
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except (OSError, pa.ArrowException) as exc:
+        # Only the temp file is ours; the existing cache is still valid.
+        print(f"Could not write history cache {table}: {exc}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+    return True
+
+
+def read_history_cache(table: str, columns=None, stamp: str | None = None) -> pd.DataFrame | None:
+    """
+    Return the cached frame for table, or None on a cache miss.
+
+    With stamp, a file built from different data (or without a stamp) is
+    a miss. The file is memory-mapped and only the requested columns are
+    materialized; float columns are handed to pandas without copying.
+    """
+    if not cache_enabled():
+        return None
+
+    path = cache_path(table)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        source = pa.memory_map(path, "r")
+        reader = ipc.open_file(source)
+        if stamp is not None and (reader.schema.metadata or {}).get(STAMP_KEY) != stamp.encode():
+            print(f"History cache {table} does not match the database; rebuilding")
+            return None
+        arrow_table = reader.read_all()
+    except (OSError, pa.ArrowException) as exc:
+        print(f"Ignoring unreadable history cache {table}: {exc}")
+        return None
+
+    if columns is not None:
+        available = set(arrow_table.column_names)
+        arrow_table = arrow_table.select(["date"] + [c for c in columns if c in available and c != "date"])
+
+    df = arrow_table.to_pandas(split_blocks=True)
+    return df.set_index("date")
+
+
+def load_history_frame(table: str, bind) -> pd.DataFrame:
+    """
+    Read a history table from the database as a date-indexed frame.
+
+    Rows are fetched in chunks of READ_CHUNK_ROWS: building the frame from
+    every row at once holds them all as Python objects first, which peaked
+    at several times the size of the finished frame.
+    """
+    chunks = pd.read_sql(text(f"SELECT * FROM {table} ORDER BY date"), bind, chunksize=READ_CHUNK_ROWS)
+    df = pd.concat(chunks, ignore_index=True)
+    df["date"] = pd.to_datetime(df["date"])
+    df = df.set_index("date")
+
+    # A column that is NULL throughout a chunk comes back as object dtype.
+    values = [column for column in df.columns if column != "id"]
+    df[values] = df[values].astype(float)
+    return df
+
+
+def load_cached_history(table: str, bind, columns=None) -> pd.DataFrame:
+    """
+    History frame for table, from the cache when it matches the database.
+
+    Otherwise the table is read from the database and the cache rewritten.
+    columns limits the frame to those columns.
+    """
+    stamp = history_stamp(table, bind) if cache_enabled() else None
+    cached = read_history_cache(table, columns, stamp=stamp)
+    if cached is not None:
+        return cached
+
+    df = load_history_frame(table, bind)
+    write_history_cache(table, df, stamp=stamp)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
+def refresh_history_cache(table: str, bind) -> bool:
+    """Rebuild the cache for table from the database; failures never propagate."""
+    if not cache_enabled():
+        return False
+
+    try:
+        stamp = history_stamp(table, bind)
+        return write_history_cache(table, load_history_frame(table, bind), stamp=stamp)
+    except Exception as exc:
+        print(f"Could not refresh history cache {table}: {exc}")
+        return False
@@ -0,0 +1,82 @@
+"""Read only helpers for market_data history and per-symbol series."""
+
+from datetime import date
+
+from sqlalchemy import select
+
+from models import MarketData, PriceBar
+
+
+# Every price column, in table order; newer columns are picked up automatically.
+HISTORY_COLUMNS = tuple(
+    column.name for column in MarketData.__table__.columns if column.name not in ("id", "date")
+)
+
+MAX_HISTORY_LIMIT = 10000
+
+
+def load_market_history(
+    db,
+    symbols=None,
+    start: date | None = None,
+    end: date | None = None,
+    limit: int | None = None,
+    cursor: date | None = None,
+) -> tuple[list[str], list[tuple], date | None]:
+    """
+    Selected market_data columns as plain tuples, oldest first.
+
+    Only the requested columns are selected and rows are never built into
+    ORM objects. cursor is the next_cursor of the previous page: rows
+    strictly after that date are returned. Returns (columns, rows,
+    next_cursor), where columns starts with "date" and next_cursor is None
+    on the last page.
+    """
+    columns = list(HISTORY_COLUMNS) if symbols is None else list(dict.fromkeys(symbols))
+    unknown = [column for column in columns if column not in HISTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown history columns: {', '.join(unknown)}")
+
+    query = select(MarketData.date, *[getattr(MarketData, column) for column in columns])
+    if start is not None:
+        query = query.where(MarketData.date >= start)
+    if end is not None:
+        query = query.where(MarketData.date <= end)
+    if cursor is not None:
+        query = query.where(MarketData.date > cursor)
+    query = query.order_by(MarketData.date)
+    if limit is not None:
+        # One extra row tells whether another page follows.
+        query = query.limit(limit + 1)
+
+    rows = [tuple(row) for row in db.execute(query).all()]
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0]
+
+    return ["date"] + columns, rows, next_cursor
+
+
+def load_symbol_history(db, symbol: str, start: date | None = None, end: date | None = None) -> tuple[list, list]:
+    """
+    One symbol's stored closes as (dates, values), oldest first, skipping gaps.
+
+    market_data columns are read from market_data; any other symbol is read
+    from price_bars, which also holds tickers without a market_data column.
+    Raises ValueError for a symbol neither table knows.
+    """
+    if symbol in HISTORY_COLUMNS:
+        _, rows, _ = load_market_history(db, symbols=[symbol], start=start, end=end)
+    else:
+        query = select(PriceBar.date, PriceBar.close).where(PriceBar.symbol == symbol)
+        if start is not None:
+            query = query.where(PriceBar.date >= start)
+        if end is not None:
+            query = query.where(PriceBar.date <= end)
+        rows = db.execute(query.order_by(PriceBar.date)).all()
+        if not rows and db.execute(select(PriceBar.id).where(PriceBar.symbol == symbol).limit(1)).first() is None:
+            raise ValueError(f"Unknown history symbol: {symbol}")
+
+    rows = [row for row in rows if row[1] is not None]
+    return [row[0] for row in rows], [row[1] for row in rows]
@@ -3,8 +3,10 @@
 from datetime import datetime, timezone
 
 import pandas as pd
+from sqlalchemy import func
 
-from models import CryptoQuote, EquityQuote, IngestionRun, MacroData, MarketData
+from models import CryptoQuote, EquityQuote, IngestionRun, MacroData, MarketData, PriceBar
+from services.bulk_writer import bulk_insert, bulk_upsert
 
 
 def _to_native_scalar(value):
@@ -14,66 +16,146 @@ def _to_native_scalar(value):
     return float(value)
 
 
-def ingest_market_data(db, df) -> int:
-    db.query(MarketData).delete()
+# DataFrame column (as produced by yahoo_provider) -> MarketData attribute.
+MARKET_DATA_COLUMNS = {
+    # --- Equities ---
+    "SP500": "sp500",
+    "NASDAQ": "nasdaq",
+    "VGK": "vgk",
+    "EWJ": "ewj",
+    "EEM": "eem",
+    "MTUM": "mtum",
+    "VTV": "vtv",
+    "IWF": "iwf",
+
+    # --- Sector ETFs (NEW) ---
+    "XLY": "xly",
+    "XLP": "xlp",
+    "XLE": "xle",
+    "XLF": "xlf",
+    "XLV": "xlv",
+    "XLK": "xlk",
+    "XLI": "xli",
+    "XLB": "xlb",
+    "XLRE": "xlre",
+    "XLC": "xlc",
+
+    # --- Bonds / Credit ---
+    "IRX": "irx",
+    "FVX": "fvx",
+    "TNX": "tnx",
+    "HYG": "hyg",
+    "LQD": "lqd",
+    "TLT": "tlt",
+    "VIX": "vix",
+
+    # --- Commodities ---
+    "Oil": "oil",
+    "NatGas": "natgas",
+    "Gold": "gold",
+    "Silver": "silver",
+    "Copper": "copper",
+
+    # --- FX ---
+    "USD_Index": "usd_index",
+    "EURUSD": "eurusd",
+    "GBPUSD": "gbpusd",
+    "AUDUSD": "audusd",
+    "USDJPY": "usdjpy",
+    "USDCHF": "usdchf",
+    "CEW": "cew",
+
+    # --- Crypto ---
+    "Bitcoin": "bitcoin",
+    "Ethereum": "ethereum",
+}
+
+
+def _frame_records(df, column_map) -> list[dict]:
+    """Convert a date-indexed frame to row dicts keyed by model attribute."""
+    frame = df.reindex(columns=list(column_map)).astype(float)
+    frame.columns = list(column_map.values())
+    frame = frame.astype(object).where(frame.notna(), None)
+
+    records = frame.to_dict("records")
+    for date, record in zip(df.index, records):
+        record["date"] = date.date()
+
+    return records
+
+
+def _fetched_columns(df, column_map) -> dict:
+    """
+    The part of column_map that has data in df.
+
+    Incremental upserts write only these, so a ticker that failed or came
+    back empty in this fetch leaves its stored values alone instead of
+    overwriting them with NULL.
+    """
+    return {
+        column: attribute
+        for column, attribute in column_map.items()
+        if column in df.columns and df[column].notna().any()
+    }
+
+
+def price_symbol(name: str) -> str:
+    """Stored price_bars symbol for a provider column name (e.g. "USD_Index" -> "usd_index")."""
+    return MARKET_DATA_COLUMNS.get(name, name.lower())
+
+
+def _price_bar_records(history) -> list[dict]:
+    frames = []
+    for name, bars in history.items():
+        frame = bars.reindex(columns=["open", "high", "low", "close", "volume"]).astype(float)
+        frame = frame.dropna(subset=["close"])
+        frame.insert(0, "symbol", price_symbol(name))
+        frame.insert(1, "date", [date.date() for date in frame.index])
+        frames.append(frame)
+
+    if not frames:
+        return []
+
+    long_frame = pd.concat(frames, ignore_index=True)
+    long_frame = long_frame.astype(object).where(long_frame.notna(), None)
+    return long_frame.to_dict("records")
+
 
-    for date, row in df.iterrows():
-        normalized = {col: _to_native_scalar(row[col]) for col in df.columns}
-
-        entry = MarketData(
-            date=date.date(),
-            # --- Equities ---
-            sp500=normalized.get("SP500"),
-            nasdaq=normalized.get("NASDAQ"),
-            vgk=normalized.get("VGK"),
-            ewj=normalized.get("EWJ"),
-            eem=normalized.get("EEM"),
-            mtum=normalized.get("MTUM"),
-            vtv=normalized.get("VTV"),
-            iwf=normalized.get("IWF"),
-
-            # --- Sector ETFs (NEW) ---
-            xly=normalized.get("XLY"),
-            xlp=normalized.get("XLP"),
-            xle=normalized.get("XLE"),
-            xlf=normalized.get("XLF"),
-            xlv=normalized.get("XLV"),
-            xlk=normalized.get("XLK"),
-            xli=normalized.get("XLI"),
-            xlb=normalized.get("XLB"),
-            xlre=normalized.get("XLRE"),
-            xlc=normalized.get("XLC"),
-
-            # --- Bonds / Credit ---
-            irx=normalized.get("IRX"),
-            fvx=normalized.get("FVX"),
-            tnx=normalized.get("TNX"),
-            hyg=normalized.get("HYG"),
-            lqd=normalized.get("LQD"),
-            tlt=normalized.get("TLT"),
-            vix=normalized.get("VIX"),
-
-            # --- Commodities ---
-            oil=normalized.get("Oil"),
-            natgas=normalized.get("NatGas"),
-            gold=normalized.get("Gold"),
-            silver=normalized.get("Silver"),
-            copper=normalized.get("Copper"),
-
-            # --- FX ---
-            usd_index=normalized.get("USD_Index"),
-            eurusd=normalized.get("EURUSD"),
-            gbpusd=normalized.get("GBPUSD"),
-            audusd=normalized.get("AUDUSD"),
-            usdjpy=normalized.get("USDJPY"),
-            usdchf=normalized.get("USDCHF"),
-            cew=normalized.get("CEW"),
-
-            # --- Crypto ---
-            bitcoin=normalized.get("Bitcoin"),
-            ethereum=normalized.get("Ethereum"),
-        )
-        db.add(entry)
+def ingest_price_bars(db, history) -> int:
+    """Upsert per-symbol OHLCV bars into price_bars keyed on (symbol, date)."""
+    records = _price_bar_records(history)
+    rows_written = bulk_upsert(db, PriceBar, records, ["symbol", "date"])
+
+    db.commit()
+    print(f"Upserted {rows_written} of {len(records)} price bars to the database.")
+    return rows_written
+
+
+def latest_market_date(db):
+    return db.query(func.max(MarketData.date)).scalar()
+
+
+def ingest_market_data(db, df, incremental=False) -> int:
+    """
+    Write market closes to market_data.
+
+    A full load replaces the table. An incremental load upserts on date, so
+    only new bars and revised overlap bars are written.
+    """
+    if incremental:
+        fetched = _fetched_columns(df, MARKET_DATA_COLUMNS)
+        if not fetched:
+            print("Fetched frame has no data; nothing to upsert.")
+            return 0
+        records = _frame_records(df, fetched)
+        rows_written = bulk_upsert(db, MarketData, records, ["date"], update_columns=list(fetched.values()))
+        db.commit()
+        print(f"Upserted {rows_written} of {len(records)} fetched rows to the database.")
+        return rows_written
+
+    records = _frame_records(df, MARKET_DATA_COLUMNS)
+    db.query(MarketData).delete()
+    bulk_insert(db, MarketData, records)
 
     db.commit()
     rows_written = len(df)
@@ -81,22 +163,42 @@ def ingest_market_data(db, df) -> int:
     return rows_written
 
 
-def ingest_macro_data(db, df) -> int:
-    db.query(MacroData).delete()
+# DataFrame column (as produced by fred_provider) -> MacroData attribute.
+MACRO_DATA_COLUMNS = {
+    "CPI": "cpi",
+    "Unemployment": "unemployment",
+    "Fed_Funds_Rate": "fed_funds_rate",
+    "GDP": "gdp",
+    "DGS2": "two_year_yield",
+    "DGS10": "ten_year_yield",
+}
+
+
+def latest_macro_date(db):
+    return db.query(func.max(MacroData.date)).scalar()
+
+
+def ingest_macro_data(db, df, incremental=False) -> int:
+    """
+    Write macro observations to macro_data.
 
-    for date, row in df.iterrows():
-        normalized = {col: _to_native_scalar(row[col]) for col in df.columns}
+    A full load replaces the table. An incremental load upserts on date so
+    revised observations inside the fetched window overwrite stored values.
+    """
+    if incremental:
+        fetched = _fetched_columns(df, MACRO_DATA_COLUMNS)
+        if not fetched:
+            print("Fetched frame has no data; nothing to upsert.")
+            return 0
+        records = _frame_records(df, fetched)
+        rows_written = bulk_upsert(db, MacroData, records, ["date"], update_columns=list(fetched.values()))
+        db.commit()
+        print(f"Upserted {rows_written} of {len(records)} fetched macro rows to database.")
+        return rows_written
 
-        entry = MacroData(
-            date=date.date(),
-            cpi=normalized["CPI"],
-            unemployment=normalized["Unemployment"],
-            fed_funds_rate=normalized["Fed_Funds_Rate"],
-            gdp=normalized["GDP"],
-            two_year_yield=normalized["DGS2"],
-            ten_year_yield=normalized["DGS10"],
-        )
-        db.add(entry)
+    records = _frame_records(df, MACRO_DATA_COLUMNS)
+    db.query(MacroData).delete()
+    bulk_insert(db, MacroData, records)
 
     db.commit()
     rows_written = len(df)
@@ -104,54 +206,76 @@ def ingest_macro_data(db, df) -> int:
     return rows_written
 
 
+def _upsert_quotes(db, model, records) -> int:
+    """Upsert quotes on (symbol, timestamp); re-fetched observations are not duplicated."""
+    if not records:
+        return 0
+
+    key_columns = ["symbol", "timestamp"]
+    update_columns = [
+        column for column in records[0]
+        if column not in key_columns and column not in ("created_at", "updated_at")
+    ]
+    return bulk_upsert(
+        db,
+        model,
+        records,
+        key_columns,
+        update_columns=update_columns,
+        touch_columns=["updated_at"],
+    )
+
+
 def ingest_crypto_quotes(db, rows) -> int:
     timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
 
-    for row in rows:
-        quote = CryptoQuote(
-            symbol=row["symbol"],
-            name=row["name"],
-            timestamp=row["timestamp"],
-            price=_to_native_scalar(row["price"]),
-            market_cap=_to_native_scalar(row["market_cap"]),
-            volume_24h=_to_native_scalar(row["volume_24h"]),
-            change_24h=_to_native_scalar(row["change_24h"]),
-            source=row["source"],
-            created_at=timestamp,
-            updated_at=timestamp,
-        )
-        db.add(quote)
+    records = [
+        {
+            "symbol": row["symbol"],
+            "name": row["name"],
+            "timestamp": row["timestamp"],
+            "price": _to_native_scalar(row["price"]),
+            "market_cap": _to_native_scalar(row["market_cap"]),
+            "volume_24h": _to_native_scalar(row["volume_24h"]),
+            "change_24h": _to_native_scalar(row["change_24h"]),
+            "source": row["source"],
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        }
+        for row in rows
+    ]
+    rows_written = _upsert_quotes(db, CryptoQuote, records)
 
     db.commit()
-    rows_written = len(rows)
-    print(f"Saved {rows_written} crypto quote rows to database.")
+    print(f"Upserted {rows_written} of {len(records)} crypto quote rows to database.")
     return rows_written
 
 
 def ingest_equity_quotes(db, rows) -> int:
     timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
 
-    for row in rows:
-        quote = EquityQuote(
-            symbol=row["symbol"],
-            timestamp=row["timestamp"],
-            price=_to_native_scalar(row["price"]),
-            change=_to_native_scalar(row["change"]),
-            percent_change=_to_native_scalar(row["percent_change"]),
-            high=_to_native_scalar(row["high"]),
-            low=_to_native_scalar(row["low"]),
-            open=_to_native_scalar(row["open"]),
-            previous_close=_to_native_scalar(row["previous_close"]),
-            volume=_to_native_scalar(row["volume"]),
-            source=row["source"],
-            created_at=timestamp,
-            updated_at=timestamp,
-        )
-        db.add(quote)
+    records = [
+        {
+            "symbol": row["symbol"],
+            "timestamp": row["timestamp"],
+            "price": _to_native_scalar(row["price"]),
+            "change": _to_native_scalar(row["change"]),
+            "percent_change": _to_native_scalar(row["percent_change"]),
+            "high": _to_native_scalar(row["high"]),
+            "low": _to_native_scalar(row["low"]),
+            "open": _to_native_scalar(row["open"]),
+            "previous_close": _to_native_scalar(row["previous_close"]),
+            "volume": _to_native_scalar(row["volume"]),
+            "source": row["source"],
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        }
+        for row in rows
+    ]
+    rows_written = _upsert_quotes(db, EquityQuote, records)
 
     db.commit()
-    rows_written = len(rows)
-    print(f"Saved {rows_written} equity quote rows to database.")
+    print(f"Upserted {rows_written} of {len(records)} equity quote rows to database.")
     return rows_written
 
 
@@ -0,0 +1,206 @@
+"""Historical backfill of calculated metrics as full daily time series."""
+
+import json
+import math
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from db import SessionLocal
+from models import CalculatedMetric, MacroData, MarketData
+from services.bulk_writer import bulk_insert
+from services.calculation_service import _utc_now_naive, upsert_latest_metrics
+from services.metric_registry import MARKET_ASSETS, METRICS
+
+
+def _frame(db, columns) -> pd.DataFrame:
+    result = db.execute(select(*columns).order_by(columns[0]))
+    df = pd.DataFrame(result.all(), columns=list(result.keys()))
+    values = df.columns.drop("date")
+    df[values] = df[values].apply(pd.to_numeric, errors="coerce").replace([np.inf, -np.inf], np.nan)
+    df["date"] = pd.to_datetime(df["date"])
+    return df.set_index("date")
+
+
+def _valid_series(df: pd.DataFrame, column: str) -> pd.Series:
+    """A column's valid observations only, as the per-date engines see them."""
+    return df[column].dropna()
+
+
+def _series_frame(name, values: pd.Series, window=None, sources=None) -> pd.DataFrame:
+    spec = METRICS[name]
+    if isinstance(window, pd.Series):
+        window = window.reindex(values.index).to_numpy()
+    out = pd.DataFrame({
+        "metric_name": name,
+        "category": spec.category,
+        "timestamp": values.index,
+        "value": values.to_numpy(dtype=float),
+        "window": spec.window if window is None else window,
+        "source_dependencies": json.dumps(list(sources or spec.sources)),
+        "calculation_version": spec.version,
+    })
+    return out[np.isfinite(out["value"])]
+
+
+def _asset_series(metric_name: str, s: pd.Series) -> list[pd.DataFrame]:
+    frames = []
+    count = pd.Series(np.arange(1, len(s) + 1), index=s.index)
+
+    frames.append(_series_frame(f"{metric_name}_5d_return", s / s.shift(5).replace(0, np.nan) - 1))
+
+    # Defined only when the trailing 21 prices are all positive.
+    log_returns = np.log(s.where(s > 0) / s.shift(1).where(s.shift(1) > 0))
+    all_positive = (s > 0).astype(float).rolling(21).min() == 1
+    volatility = log_returns.rolling(20).std(ddof=1) * math.sqrt(252)
+    frames.append(_series_frame(f"{metric_name}_20d_volatility", volatility.where(all_positive)))
+
+    peak = s.cummax()
+    frames.append(_series_frame(f"{metric_name}_drawdown_from_peak", (s - peak) / peak.replace(0, np.nan)))
+
+    # 252d window once available, otherwise all history from 60 observations.
+    full = count >= 252
+    mean = s.rolling(252).mean().where(full, s.expanding(min_periods=60).mean())
+    std = s.rolling(252).std(ddof=1).where(full, s.expanding(min_periods=60).std(ddof=1))
+    zscore = (s - mean) / std.replace(0, np.nan)
+    frames.append(_series_frame(
+        f"{metric_name}_price_zscore_252d",
+        zscore,
+        pd.Series(np.where(full, "252d", "available_history"), index=s.index),
+    ))
+
+    for window in (50, 200):
+        moving_average = s.rolling(window).mean().replace(0, np.nan)
+        frames.append(_series_frame(f"{metric_name}_ma_distance_{window}d", (s - moving_average) / moving_average))
+
+    return frames
+
+
+def _macro_series(macro: pd.DataFrame) -> list[pd.DataFrame]:
+    frames = []
+
+    yields = macro[["ten_year_yield", "two_year_yield"]].dropna()
+    frames.append(_series_frame("yield_curve_slope_10y_2y", yields["ten_year_yield"] - yields["two_year_yield"]))
+
+    # CPI YoY uses the latest non-zero CPI print at least 365 days earlier.
+    current = macro[["fed_funds_rate", "cpi"]].dropna().reset_index()
+    prior = macro["cpi"].dropna()
+    prior = prior[prior != 0].rename("prior_cpi").reset_index()
+    if not current.empty and not prior.empty:
+        current["target"] = (current["date"] - timedelta(days=365)).astype("datetime64[ns]")
+        prior["date"] = prior["date"].astype("datetime64[ns]")
+        joined = pd.merge_asof(
+            current.sort_values("target"),
+            prior.rename(columns={"date": "target"}),
+            on="target",
+            direction="backward",
+        ).set_index("date").sort_index()
+        real_rate = joined["fed_funds_rate"] - ((joined["cpi"] / joined["prior_cpi"]) - 1) * 100
+        frames.append(_series_frame("real_rate_proxy", real_rate))
+
+    return frames
+
+
+def compute_metric_history(market: pd.DataFrame, macro: pd.DataFrame) -> pd.DataFrame:
+    """
+    Every calculated metric for every historical date, in long format.
+
+    Mirrors calculate_metrics' definitions evaluated at each date on the
+    history available up to it. btc_eth_ratio uses market_data closes, since
+    crypto_quotes only hold recent snapshots.
+    """
+    frames = _macro_series(macro)
+
+    usd = _valid_series(market, "usd_index")
+    frames.append(_series_frame("dxy_1d_return", usd / usd.shift(1).replace(0, np.nan) - 1))
+
+    crypto = market[["bitcoin", "ethereum"]].dropna()
+    frames.append(_series_frame(
+        "btc_eth_ratio",
+        crypto["bitcoin"] / crypto["ethereum"].replace(0, np.nan),
+        sources=["market_data"],
+    ))
+
+    for metric_name, field in MARKET_ASSETS.items():
+        frames.extend(_asset_series(metric_name, _valid_series(market, field)))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def _existing_keys(db, metric_names) -> pd.MultiIndex:
+    rows = db.execute(
+        select(CalculatedMetric.metric_name, CalculatedMetric.timestamp, CalculatedMetric.calculation_version)
+        .where(CalculatedMetric.metric_name.in_(metric_names))
+    ).all()
+    return pd.MultiIndex.from_tuples(
+        [
+            (row.metric_name, pd.Timestamp(row.timestamp))
+            for row in rows
+            if row.calculation_version == METRICS[row.metric_name].version
+        ],
+        names=["metric_name", "timestamp"],
+    )
+
+
+def backfill_metric_history(db=None) -> tuple[int, int]:
+    """
+    Write the full history of every calculated metric, appending only new dates.
+
+    (metric_name, timestamp) pairs already stored at the metric's registry
+    version are skipped, so the first run backfills everything
+    and later runs add just the dates ingested since. Returns
+    (rows_written, rows_inspected).
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        market_columns = [MarketData.date] + [getattr(MarketData, field) for field in MARKET_ASSETS.values()]
+        market = _frame(db, market_columns)
+        macro = _frame(db, [MacroData.date, MacroData.ten_year_yield, MacroData.two_year_yield,
+                            MacroData.fed_funds_rate, MacroData.cpi])
+        rows_inspected = len(market) + len(macro)
+
+        history = compute_metric_history(market, macro)
+        if history.empty:
+            print("Metric backfill: no history to write")
+            return 0, rows_inspected
+
+        existing = _existing_keys(db, history["metric_name"].unique().tolist())
+        keys = pd.MultiIndex.from_arrays([history["metric_name"], history["timestamp"]])
+        new_rows = history[~keys.isin(existing)]
+
+        timestamp = _utc_now_naive()
+        rows = [
+            {
+                "metric_name": metric_name,
+                "category": category,
+                "timestamp": observed.to_pydatetime(),
+                "value": float(value),
+                "window": window,
+                "source_dependencies": sources,
+                "calculation_version": version,
+                "created_at": timestamp,
+                "updated_at": timestamp,
+            }
+            for metric_name, category, observed, value, window, sources, version in new_rows.itertuples(index=False)
+        ]
+        bulk_insert(db, CalculatedMetric, rows)
+        upsert_latest_metrics(db, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+    print(f"Metric backfill: wrote {len(rows)} of {len(history)} historical metric rows.")
+    return len(rows), rows_inspected
+
+
+if __name__ == "__main__":
+    backfill_metric_history()
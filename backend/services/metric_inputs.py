@@ -0,0 +1,150 @@
+"""Input digests for calculated metrics, used to skip metrics whose inputs are unchanged."""
+
+import hashlib
+import math
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from models import LatestCalculatedMetric, MetricInputHash
+from services.bulk_writer import bulk_upsert
+from services.metric_registry import MACRO_LOOKBACK_DAYS, METRICS
+
+
+# The per-asset metrics read at most the last ASSET_WINDOW prices (252d
+# z-score), plus the all-time peak and the observation count.
+ASSET_WINDOW = 252
+
+
+def _valid(value) -> bool:
+    return value is not None and math.isfinite(float(value))
+
+
+def digest(*parts) -> str:
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def series_digest(observations) -> str:
+    """Digest of (date, value) pairs in order."""
+    observations = list(observations)
+    days = np.fromiter((day.toordinal() for day, _ in observations), dtype=np.int64, count=len(observations))
+    values = np.fromiter((value for _, value in observations), dtype=np.float64, count=len(observations))
+    hasher = hashlib.sha256()
+    hasher.update(days.tobytes())
+    hasher.update(values.tobytes())
+    return hasher.hexdigest()
+
+
+def asset_digest(count, peak, last_date, window_values) -> str:
+    """
+    Digest of everything the per-asset market metrics read.
+
+    Both the full engine (from the column's history) and the incremental one
+    (from its rolling state) compute this, so switching modes does not make
+    unchanged inputs look changed. window_values are the last ASSET_WINDOW
+    valid prices, oldest first.
+    """
+    return digest(
+        count,
+        None if peak is None else float(peak),
+        last_date.isoformat() if last_date else None,
+        np.asarray(list(window_values), dtype=np.float64).tobytes(),
+    )
+
+
+def observations_asset_digest(observations) -> str:
+    """asset_digest() of a column's full list of valid (date, value) observations."""
+    if not observations:
+        return asset_digest(0, None, None, [])
+    return asset_digest(
+        len(observations),
+        max(value for _, value in observations),
+        observations[-1][0],
+        [value for _, value in observations[-ASSET_WINDOW:]],
+    )
+
+
+def _column_observations(rows, field):
+    return [(row.date, float(getattr(row, field))) for row in rows if _valid(getattr(row, field))]
+
+
+def market_input_digests(market_rows, fields) -> dict[str, str]:
+    """Per-asset digests for each market_data column, plus the last-two-bars dxy input."""
+    digests = {}
+    for field in fields:
+        observations = _column_observations(market_rows, field)
+        digests[f"market_data.{field}"] = observations_asset_digest(observations)
+        if field == "usd_index":
+            digests["market_data.usd_index:last2"] = digest(observations[-2:])
+    return digests
+
+
+def macro_input_digests(macro_rows) -> dict[str, str]:
+    """Digests of each macro column over the window the macro metrics read."""
+    window = []
+    if macro_rows:
+        start = macro_rows[-1].date - timedelta(days=MACRO_LOOKBACK_DAYS)
+        window = [row for row in macro_rows if row.date >= start]
+    return {
+        f"macro_data.{field}": series_digest(_column_observations(window, field))
+        for field in ("ten_year_yield", "two_year_yield", "fed_funds_rate", "cpi")
+    }
+
+
+def crypto_input_digests(crypto_rows, market_rows) -> dict[str, str]:
+    """Digests of the latest BTC/ETH quotes and the latest market_data pair."""
+    latest = {}
+    for row in crypto_rows:
+        if row.symbol in ("BTC", "ETH") and _valid(row.price):
+            if row.symbol not in latest or row.timestamp > latest[row.symbol][1]:
+                latest[row.symbol] = (row.symbol, row.timestamp, float(row.price))
+
+    market_pair = None
+    for row in reversed(market_rows):
+        if _valid(row.bitcoin) and _valid(row.ethereum):
+            market_pair = (row.date, float(row.bitcoin), float(row.ethereum))
+            break
+
+    return {
+        "crypto_quotes.latest": digest(sorted(latest.values())),
+        "market_data.bitcoin_ethereum:latest": digest(market_pair),
+    }
+
+
+def metric_hashes(input_digests: dict[str, str]) -> dict[str, str]:
+    """Hash per metric over its definition and its inputs' digests."""
+    hashes = {}
+    for spec in METRICS.values():
+        if all(name in input_digests for name in spec.inputs):
+            hashes[spec.name] = digest(
+                spec.name, spec.version, spec.window, spec.sources,
+                *(input_digests[name] for name in spec.inputs),
+            )
+    return hashes
+
+
+def changed_metric_names(db, hashes: dict[str, str]) -> set[str]:
+    """Metrics whose hash differs from the stored one, or that have no stored row."""
+    stored = dict(db.execute(select(MetricInputHash.metric_name, MetricInputHash.input_hash)).all())
+    # One row per metric, kept in step with calculated_metrics inserts.
+    present = set(db.execute(select(LatestCalculatedMetric.metric_name)).scalars())
+    return {
+        name
+        for name, value in hashes.items()
+        if stored.get(name) != value or name not in present
+    }
+
+
+def save_input_hashes(db, hashes: dict[str, str], timestamp) -> None:
+    """Upsert hashes without committing; the caller commits with the metrics."""
+    rows = [
+        {
+            "metric_name": name,
+            "input_hash": value,
+            "calculation_version": METRICS[name].version,
+            "updated_at": timestamp,
+        }
+        for name, value in hashes.items()
+    ]
+    bulk_upsert(db, MetricInputHash, rows, ["metric_name"])
@@ -1,9 +1,11 @@
 """Read only helpers for loading calculated metrics from database."""
 
+from datetime import datetime, time, timedelta
+
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from models import CalculatedMetric
+from models import CalculatedMetric, LatestCalculatedMetric
 
 
 def _row_to_dict(row: CalculatedMetric) -> dict:
@@ -18,13 +20,7 @@ def _row_to_dict(row: CalculatedMetric) -> dict:
     }
 
 
-def load_latest_calculated_metrics(db: Session) -> dict[str, dict]:
-    """
-    Return latest row per metric_name from calculated_metrics.
-
-    When duplicate refreshes exist for the same metric, the row with the
-    most recent timestamp wins. Ties on timestamp resolve to the highest id.
-    """
+def _load_latest_from_history(db: Session) -> dict[str, dict]:
     latest_ts = (
         db.query(
             CalculatedMetric.metric_name,
@@ -51,3 +47,51 @@ def load_latest_calculated_metrics(db: Session) -> dict[str, dict]:
             result[row.metric_name] = _row_to_dict(row)
 
     return result
+
+
+def load_latest_calculated_metrics(db: Session) -> dict[str, dict]:
+    """
+    Return latest row per metric_name from calculated_metrics.
+
+    Reads latest_calculated_metrics, which holds one row per metric and is
+    updated in the same transaction as every calculated_metrics insert.
+    The newest timestamp wins; ties resolve to the most recent insert.
+    Falls back to scanning calculated_metrics if it has not been populated.
+    """
+    rows = db.query(LatestCalculatedMetric).order_by(LatestCalculatedMetric.metric_name).all()
+    if not rows:
+        return _load_latest_from_history(db)
+
+    return {row.metric_name: _row_to_dict(row) for row in rows}
+
+
+def load_metric_history(db: Session, metric_name: str, start=None, end=None) -> list[dict]:
+    """
+    Return one row per timestamp for metric_name, oldest first.
+
+    Repeated refreshes of the same timestamp resolve to the highest id.
+    A date end includes that whole day; a datetime end is inclusive as given.
+    """
+    query = db.query(CalculatedMetric).filter(CalculatedMetric.metric_name == metric_name)
+    if start is not None:
+        if not isinstance(start, datetime):
+            start = datetime.combine(start, time.min)
+        query = query.filter(CalculatedMetric.timestamp >= start)
+    if end is not None:
+        if isinstance(end, datetime):
+            query = query.filter(CalculatedMetric.timestamp <= end)
+        else:
+            # timestamp is a DateTime: compare against the start of the next day.
+            query = query.filter(CalculatedMetric.timestamp < datetime.combine(end + timedelta(days=1), time.min))
+
+    rows = query.order_by(CalculatedMetric.timestamp, CalculatedMetric.id.desc()).all()
+
+    result: list[dict] = []
+    last_timestamp = None
+    for row in rows:
+        if result and row.timestamp == last_timestamp:
+            continue
+        result.append(_row_to_dict(row))
+        last_timestamp = row.timestamp
+
+    return result
@@ -0,0 +1,114 @@
+"""Declarative definitions of every calculated metric."""
+
+from dataclasses import dataclass
+
+
+CALCULATION_VERSION = "v1"
+
+# Metric name prefix -> MarketData column for the per-asset market metrics.
+MARKET_ASSETS = {
+    "sp500": "sp500",
+    "nasdaq": "nasdaq",
+    "vix": "vix",
+    "gold": "gold",
+    "usd_index": "usd_index",
+    "bitcoin": "bitcoin",
+    "ethereum": "ethereum",
+    "tlt": "tlt",
+}
+
+# Per-asset metric suffix -> declared window.
+ASSET_METRIC_WINDOWS = {
+    "5d_return": "5d",
+    "20d_volatility": "20d",
+    "drawdown_from_peak": "1y",
+    "price_zscore_252d": "252d",
+    "ma_distance_50d": "50d",
+    "ma_distance_200d": "200d",
+}
+
+# real_rate_proxy needs the CPI print from a year before the latest one.
+MACRO_LOOKBACK_DAYS = 400
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    name: str
+    category: str
+    window: str
+    # "table.column" input slices the value is computed from.
+    inputs: tuple[str, ...]
+    # Metrics in one group are computed together by the same routine.
+    group: str
+    sources: tuple[str, ...]
+    version: str = CALCULATION_VERSION
+    asset: str | None = None
+
+
+def _asset_specs(asset: str, field: str) -> list[MetricSpec]:
+    return [
+        MetricSpec(
+            name=f"{asset}_{suffix}",
+            category="market",
+            window=window,
+            inputs=(f"market_data.{field}",),
+            group=asset,
+            sources=("market_data",),
+            asset=asset,
+        )
+        for suffix, window in ASSET_METRIC_WINDOWS.items()
+    ]
+
+
+_SPECS = [
+    MetricSpec(
+        name="yield_curve_slope_10y_2y",
+        category="macro",
+        window="latest",
+        inputs=("macro_data.ten_year_yield", "macro_data.two_year_yield"),
+        group="macro",
+        sources=("macro_data",),
+    ),
+    MetricSpec(
+        name="real_rate_proxy",
+        category="macro",
+        window="latest",
+        inputs=("macro_data.fed_funds_rate", "macro_data.cpi"),
+        group="macro",
+        sources=("macro_data",),
+    ),
+    MetricSpec(
+        name="dxy_1d_return",
+        category="fx",
+        window="1d",
+        inputs=("market_data.usd_index:last2",),
+        group="dxy",
+        sources=("market_data",),
+    ),
+    MetricSpec(
+        name="btc_eth_ratio",
+        category="crypto",
+        window="latest",
+        # Latest crypto quotes, falling back to the latest market_data closes.
+        inputs=("crypto_quotes.latest", "market_data.bitcoin_ethereum:latest"),
+        group="btc_eth",
+        sources=("crypto_quotes",),
+    ),
+]
+for _asset, _field in MARKET_ASSETS.items():
+    _SPECS.extend(_asset_specs(_asset, _field))
+
+# Registration order is the order metrics are emitted in.
+METRICS: dict[str, MetricSpec] = {spec.name: spec for spec in _SPECS}
+
+
+def get_metric(name: str) -> MetricSpec:
+    return METRICS[name]
+
+
+def metric_names(group: str | None = None) -> list[str]:
+    return [spec.name for spec in METRICS.values() if group is None or spec.group == group]
+
+
+def groups_for(names) -> set[str]:
+    return {METRICS[name].group for name in names}
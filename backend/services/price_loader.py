@@ -0,0 +1,73 @@
+"""Read only helpers for loading the long-format price_bars table."""
+
+import pandas as pd
+from sqlalchemy import select
+
+from models import MarketData, PriceBar
+
+
+PRICE_FIELDS = ("open", "high", "low", "close", "volume")
+
+# Wide column order used by market_data; other symbols follow alphabetically.
+_MARKET_DATA_ORDER = [
+    column.name for column in MarketData.__table__.columns if column.name not in ("id", "date")
+]
+
+
+def _column_order(symbols) -> list[str]:
+    known = [symbol for symbol in _MARKET_DATA_ORDER if symbol in symbols]
+    extra = sorted(symbol for symbol in symbols if symbol not in _MARKET_DATA_ORDER)
+    return known + extra
+
+
+def load_price_bars(bind, symbols=None, start=None, end=None, fields=("close",)) -> pd.DataFrame:
+    """Return long rows (symbol, date, *fields) filtered by symbol and date range."""
+    unknown = [field for field in fields if field not in PRICE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown price fields: {', '.join(unknown)}")
+
+    query = select(PriceBar.symbol, PriceBar.date, *[getattr(PriceBar, field) for field in fields])
+    if symbols is not None:
+        query = query.where(PriceBar.symbol.in_(list(symbols)))
+    if start is not None:
+        query = query.where(PriceBar.date >= start)
+    if end is not None:
+        query = query.where(PriceBar.date <= end)
+    query = query.order_by(PriceBar.symbol, PriceBar.date)
+
+    df = pd.read_sql(query, bind)
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def load_price_matrix(
+    bind,
+    symbols=None,
+    start=None,
+    end=None,
+    field: str = "close",
+    complete_rows: bool = False,
+) -> pd.DataFrame:
+    """
+    Pivot price_bars into a wide date x symbol frame.
+
+    The frame has a DatetimeIndex named "date" and one float column per
+    symbol in market_data column order, with NaN where a symbol has no bar;
+    symbols with shorter history (e.g. price_bars-only tickers) do not cut
+    the others short. Pass complete_rows=True to keep only dates where every
+    requested symbol has a value; with symbols set to the market_data
+    columns this matches signals_engine.load_market_data(), since
+    market_data stores complete rows only.
+    """
+    long_df = load_price_bars(bind, symbols=symbols, start=start, end=end, fields=(field,))
+
+    wide = long_df.pivot(index="date", columns="symbol", values=field)
+    wide = wide.reindex(columns=_column_order(set(wide.columns))).astype(float)
+    wide.columns.name = None
+    wide.index.name = "date"
+    wide.sort_index(inplace=True)
+
+    if complete_rows:
+        wide.dropna(inplace=True)
+
+    return wide
@@ -0,0 +1,257 @@
+"""Retention and compaction for the append-heavy quote, metric and run tables."""
+
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+import pandas as pd
+from sqlalchemy import bindparam, func, select, text
+
+from db import SessionLocal
+from models import CryptoQuote, EquityQuote, IngestionRun, QuoteDailyBar
+from services.bulk_writer import bulk_upsert
+from services.data_version import current_data_version
+from services.metric_loader import load_latest_calculated_metrics
+
+
+@dataclass
+class RetentionPolicy:
+    # Raw quote snapshots newer than this are kept; older ones become daily bars.
+    quote_raw_days: int = int(os.getenv("RETENTION_QUOTE_RAW_DAYS", "7"))
+    # ingestion_runs audit rows older than this are deleted.
+    ingestion_run_days: int = int(os.getenv("RETENTION_INGESTION_RUN_DAYS", "90"))
+    # Rebuild the SQLite file afterwards so freed pages return to the OS.
+    vacuum: bool = os.getenv("RETENTION_VACUUM", "false").lower() in ("1", "true", "yes")
+
+
+@dataclass
+class RetentionReport:
+    quote_bars_written: dict = field(default_factory=dict)
+    rows_deleted: dict = field(default_factory=dict)
+    bytes_before: int | None = None
+    bytes_after: int | None = None
+    latest_metrics_ms_before: float | None = None
+    latest_metrics_ms_after: float | None = None
+
+    def as_dict(self) -> dict:
+        reclaimed = None
+        if self.bytes_before is not None and self.bytes_after is not None:
+            reclaimed = self.bytes_before - self.bytes_after
+        return {
+            "quote_bars_written": self.quote_bars_written,
+            "rows_deleted": self.rows_deleted,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_reclaimed": reclaimed,
+            "latest_metrics_ms_before": self.latest_metrics_ms_before,
+            "latest_metrics_ms_after": self.latest_metrics_ms_after,
+        }
+
+
+QUOTE_TABLES = (
+    ("equity", EquityQuote),
+    ("crypto", CryptoQuote),
+)
+
+
+def _utc_now_naive():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _day_cutoff(days: int) -> datetime:
+    # Whole days only, so a day's snapshots are always compacted together.
+    return datetime.combine((_utc_now_naive() - timedelta(days=days)).date(), dt_time.min)
+
+
+def _delete_ids(db, model, ids, chunk_size=500) -> int:
+    statement = (
+        model.__table__.delete()
+        .where(model.__table__.c.id.in_(bindparam("ids", expanding=True)))
+    )
+    for start in range(0, len(ids), chunk_size):
+        db.execute(statement, {"ids": ids[start:start + chunk_size]})
+    return len(ids)
+
+
+def _daily_bars(snapshots: pd.DataFrame) -> pd.DataFrame:
+    snapshots = snapshots.sort_values(["symbol", "timestamp", "id"])
+    snapshots["date"] = snapshots["timestamp"].dt.date
+    grouped = snapshots.groupby(["symbol", "date"], sort=False)
+    return grouped.agg(
+        open=("price", "first"),
+        high=("price", "max"),
+        low=("price", "min"),
+        close=("price", "last"),
+        samples=("price", "size"),
+        first_timestamp=("timestamp", "min"),
+        last_timestamp=("timestamp", "max"),
+        source=("source", "last"),
+    ).reset_index()
+
+
+def _merge_existing_bars(db, asset_type: str, bars: pd.DataFrame) -> pd.DataFrame:
+    """Fold previously written bars for the same days into the new ones."""
+    existing = pd.read_sql(
+        select(QuoteDailyBar).where(
+            QuoteDailyBar.asset_type == asset_type,
+            QuoteDailyBar.symbol.in_(sorted(set(bars["symbol"]))),
+            QuoteDailyBar.date.in_(sorted(set(bars["date"]))),
+        ),
+        db.connection(),
+    )
+    if existing.empty:
+        return bars
+
+    existing = existing.drop(columns=["id", "asset_type"])
+    existing["first_timestamp"] = pd.to_datetime(existing["first_timestamp"])
+    existing["last_timestamp"] = pd.to_datetime(existing["last_timestamp"])
+
+    combined = pd.concat([existing, bars], ignore_index=True)
+    opens = combined.sort_values("first_timestamp").groupby(["symbol", "date"])["open"].first()
+    closes = combined.sort_values("last_timestamp").groupby(["symbol", "date"])[["close", "source"]].last()
+    merged = combined.groupby(["symbol", "date"]).agg(
+        high=("high", "max"),
+        low=("low", "min"),
+        samples=("samples", "sum"),
+        first_timestamp=("first_timestamp", "min"),
+        last_timestamp=("last_timestamp", "max"),
+    )
+    return merged.join(opens).join(closes).reset_index()
+
+
+def compact_quotes(db, asset_type: str, model, cutoff: datetime) -> tuple[int, int]:
+    """Roll snapshots older than cutoff into quote_daily_bars and delete them."""
+    snapshots = pd.read_sql(
+        select(model.id, model.symbol, model.timestamp, model.price, model.source)
+        .where(model.timestamp < cutoff, model.price.is_not(None)),
+        db.connection(),
+    )
+    if snapshots.empty:
+        return 0, 0
+
+    snapshots["timestamp"] = pd.to_datetime(snapshots["timestamp"])
+    bars = _merge_existing_bars(db, asset_type, _daily_bars(snapshots))
+    bars["asset_type"] = asset_type
+
+    records = bars.astype(object).where(bars.notna(), None).to_dict("records")
+    for record in records:
+        record["samples"] = int(record["samples"])
+        record["first_timestamp"] = pd.Timestamp(record["first_timestamp"]).to_pydatetime()
+        record["last_timestamp"] = pd.Timestamp(record["last_timestamp"]).to_pydatetime()
+    bars_written = bulk_upsert(db, QuoteDailyBar, records, ["asset_type", "symbol", "date"])
+
+    ids = [int(value) for value in snapshots["id"]]
+    deleted = _delete_ids(db, model, ids)
+
+    # Snapshots without a price carry no information for a bar; drop them too.
+    result = db.execute(
+        model.__table__.delete().where(model.timestamp < cutoff, model.price.is_(None))
+    )
+    return bars_written, deleted + max(result.rowcount or 0, 0)
+
+
+def collapse_superseded_metrics(db) -> int:
+    """Keep only the newest row per (metric_name, timestamp) in calculated_metrics."""
+    result = db.execute(text(
+        "DELETE FROM calculated_metrics WHERE id NOT IN "
+        "(SELECT MAX(id) FROM calculated_metrics GROUP BY metric_name, timestamp)"
+    ))
+    return max(result.rowcount or 0, 0)
+
+
+def prune_ingestion_runs(db, cutoff: datetime) -> int:
+    """
+    Delete runs started before cutoff, except the newest run and the data version's run.
+
+    The data version is the id of the newest successful run that wrote rows;
+    deleting that run would move the version back onto ids that stored
+    snapshots are keyed on. Keeping the newest run keeps max(id) in place,
+    so SQLite (no AUTOINCREMENT) never hands a deleted id out again.
+    """
+    keep = {current_data_version(db), db.execute(select(func.max(IngestionRun.id))).scalar()}
+    keep.discard(None)
+    keep.discard(0)
+
+    query = IngestionRun.__table__.delete().where(IngestionRun.started_at < cutoff)
+    if keep:
+        query = query.where(IngestionRun.id.not_in(keep))
+    result = db.execute(query)
+    return max(result.rowcount or 0, 0)
+
+
+def _database_bytes(db) -> int | None:
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        page_count = db.execute(text("PRAGMA page_count")).scalar()
+        freelist = db.execute(text("PRAGMA freelist_count")).scalar()
+        page_size = db.execute(text("PRAGMA page_size")).scalar()
+        return (page_count - freelist) * page_size
+    if dialect == "postgresql":
+        tables = ["equity_quotes", "crypto_quotes", "calculated_metrics", "ingestion_runs", "quote_daily_bars"]
+        return int(sum(
+            db.execute(text("SELECT pg_total_relation_size(:t)"), {"t": table}).scalar() or 0
+            for table in tables
+        ))
+    return None
+
+
+def _time_latest_metrics(db, repeats: int = 5) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        load_latest_calculated_metrics(db)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(min(timings), 3)
+
+
+def run_retention(db=None, policy: RetentionPolicy | None = None) -> dict:
+    """
+    Apply the retention policy and report what it reclaimed.
+
+    Reports rows deleted per table, daily bars written, live database bytes
+    before and after (SQLite pages in use, or Postgres relation sizes) and
+    the best-of-5 load_latest_calculated_metrics time before and after.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    policy = policy or RetentionPolicy()
+    report = RetentionReport()
+
+    try:
+        report.bytes_before = _database_bytes(db)
+        report.latest_metrics_ms_before = _time_latest_metrics(db)
+
+        quote_cutoff = _day_cutoff(policy.quote_raw_days)
+        for asset_type, model in QUOTE_TABLES:
+            bars, deleted = compact_quotes(db, asset_type, model, quote_cutoff)
+            report.quote_bars_written[model.__tablename__] = bars
+            report.rows_deleted[model.__tablename__] = deleted
+
+        report.rows_deleted["calculated_metrics"] = collapse_superseded_metrics(db)
+        report.rows_deleted["ingestion_runs"] = prune_ingestion_runs(
+            db, _day_cutoff(policy.ingestion_run_days),
+        )
+        db.commit()
+
+        if policy.vacuum and db.get_bind().dialect.name == "sqlite":
+            with db.get_bind().connect() as conn:
+                conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+        report.bytes_after = _database_bytes(db)
+        report.latest_metrics_ms_after = _time_latest_metrics(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+    result = report.as_dict()
+    print(f"Retention complete: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    run_retention()
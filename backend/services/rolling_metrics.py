@@ -0,0 +1,392 @@
+"""Rolling per-asset state so new bars update market metrics in O(1) per asset."""
+
+import math
+from collections import deque
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+
+from models import CryptoQuote, MacroData, MarketData, MetricRollingState
+from services.bulk_writer import bulk_upsert
+from services.calculation_service import (
+    _add_metric,
+    _calculate_btc_eth_ratio,
+    _calculate_macro_metrics,
+    _emit_asset_metrics,
+    _is_valid_number,
+    _metric,
+    _safe_ratio_return,
+    _select_rows,
+    _utc_now_naive,
+    select_changed_metrics,
+)
+from services.metric_inputs import (
+    ASSET_WINDOW,
+    asset_digest,
+    crypto_input_digests,
+    digest,
+    macro_input_digests,
+    metric_hashes,
+)
+from services.metric_registry import CALCULATION_VERSION, MACRO_LOOKBACK_DAYS, MARKET_ASSETS, groups_for
+
+
+ZSCORE_WINDOW = ASSET_WINDOW
+VOL_WINDOW = 21  # prices, i.e. 20 log returns
+MA_WINDOWS = (50, 200)
+
+# The newest observations are stored with their dates and compared with the
+# database on every run; a mismatch means a revised bar and triggers a rebuild.
+RECENT_CHECK = 10
+
+# Running sums drift with floating-point error; recompute them from the
+# buffered window this often (amortized O(1)).
+REBASE_INTERVAL = ZSCORE_WINDOW
+
+
+def _welford_add(stats, value):
+    n, mean, m2 = stats
+    n += 1
+    delta = value - mean
+    mean += delta / n
+    m2 += delta * (value - mean)
+    return [n, mean, m2]
+
+
+def _welford_remove(stats, value):
+    n, mean, m2 = stats
+    if n <= 1:
+        return [0, 0.0, 0.0]
+    n -= 1
+    delta = value - mean
+    mean -= delta / n
+    m2 -= delta * (value - mean)
+    return [n, mean, max(m2, 0.0)]
+
+
+def _welford_from(values):
+    stats = [0, 0.0, 0.0]
+    for value in values:
+        stats = _welford_add(stats, value)
+    return stats
+
+
+def _sample_std(stats):
+    n, _, m2 = stats
+    return math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+
+
+class RollingAssetState:
+    """
+    Trailing-window state for one asset's price series.
+
+    Keeps the last 252 prices plus running aggregates: sums for the 50/200d
+    moving averages, Welford mean/M2 for the 252d z-score and for the 20d
+    log-return volatility, and the all-time peak for drawdown.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.peak = None
+        self.last_date = None
+        self.values = deque(maxlen=ZSCORE_WINDOW)
+        self.recent_dates = deque(maxlen=RECENT_CHECK)
+        self.ma_sums = {window: 0.0 for window in MA_WINDOWS}
+        self.zscore_stats = [0, 0.0, 0.0]
+        self.vol_stats = [0, 0.0, 0.0]
+        self.nonpositive = 0  # non-positive prices within the last VOL_WINDOW
+        self.updates_since_rebase = 0
+
+    @classmethod
+    def from_history(cls, observations):
+        state = cls()
+        for day, value in observations:
+            state.push(day, value)
+        return state
+
+    def _window(self, size):
+        values = self.values
+        return [values[i] for i in range(max(0, len(values) - size), len(values))]
+
+    def _vol_window_returns(self):
+        window = self._window(VOL_WINDOW)
+        return [math.log(window[i] / window[i - 1]) for i in range(1, len(window))]
+
+    def _rebase(self):
+        for window in MA_WINDOWS:
+            self.ma_sums[window] = math.fsum(self._window(window))
+        self.zscore_stats = _welford_from(self.values)
+        self.vol_stats = _welford_from(self._vol_window_returns()) if self.nonpositive == 0 else [0, 0.0, 0.0]
+        self.updates_since_rebase = 0
+
+    def push(self, day, value):
+        """Append one observation; invalid values are ignored like the batch engines do."""
+        if not _is_valid_number(value):
+            return
+        value = float(value)
+        values = self.values
+        n = len(values)
+
+        for window in MA_WINDOWS:
+            self.ma_sums[window] += value
+            if n >= window:
+                self.ma_sums[window] -= values[n - window]
+
+        if n >= ZSCORE_WINDOW:
+            self.zscore_stats = _welford_remove(self.zscore_stats, values[0])
+        self.zscore_stats = _welford_add(self.zscore_stats, value)
+
+        vol_valid = self.nonpositive == 0
+        if n >= VOL_WINDOW:
+            leaving = values[n - VOL_WINDOW]
+            if leaving <= 0:
+                self.nonpositive -= 1
+            elif vol_valid:
+                self.vol_stats = _welford_remove(
+                    self.vol_stats, math.log(values[n - VOL_WINDOW + 1] / leaving),
+                )
+        if value <= 0:
+            self.nonpositive += 1
+
+        values.append(value)
+        self.recent_dates.append(day)
+        self.count += 1
+        self.last_date = day
+        self.peak = value if self.peak is None else max(self.peak, value)
+
+        if self.nonpositive:
+            self.vol_stats = [0, 0.0, 0.0]
+        elif not vol_valid:
+            # The window just became all-positive again; rebuild it (<= 20 returns).
+            self.vol_stats = _welford_from(self._vol_window_returns())
+        elif n >= 1:
+            self.vol_stats = _welford_add(self.vol_stats, math.log(value / values[-2]))
+
+        self.updates_since_rebase += 1
+        if self.updates_since_rebase >= REBASE_INTERVAL:
+            self._rebase()
+
+    def recent_observations(self) -> list:
+        return list(zip(self.recent_dates, self._window(len(self.recent_dates))))
+
+    def fingerprint(self) -> str:
+        """The asset's input digest, identical to the full engine's for the same bars."""
+        return asset_digest(self.count, self.peak, self.last_date, self.values)
+
+    def matches(self, observations) -> bool:
+        """True if the stored recent (date, value) pairs equal the database's."""
+        recent = self.recent_observations()
+        if not recent:
+            return True
+        first = recent[0][0]
+        stored = [(day, value) for day, value in observations if first <= day <= self.last_date]
+        return stored == recent
+
+    def emit(self, metrics, metric_name):
+        values = self.values
+        if self.count == 0:
+            _emit_asset_metrics(metrics, metric_name, 0, None, None, None, None, None, None, None, {})
+            return
+
+        latest_value = values[-1]
+        return_5d = _safe_ratio_return(latest_value, values[-6]) if self.count >= 6 else None
+        volatility = None
+        if self.count >= VOL_WINDOW and self.nonpositive == 0:
+            volatility = _sample_std(self.vol_stats) * math.sqrt(252)
+
+        zscore_std = _sample_std(self.zscore_stats)
+        zscore = (latest_value - self.zscore_stats[1]) / zscore_std if zscore_std else None
+
+        _emit_asset_metrics(
+            metrics,
+            metric_name,
+            count=self.count,
+            latest_date=self.last_date,
+            latest_value=latest_value,
+            return_5d=return_5d,
+            volatility=volatility,
+            peak=self.peak,
+            zscore=zscore,
+            zscore_std=zscore_std,
+            moving_averages={window: total / window for window, total in self.ma_sums.items()},
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "count": self.count,
+            "peak": self.peak,
+            "last_date": self.last_date.isoformat() if self.last_date else None,
+            "values": list(self.values),
+            "recent_dates": [day.isoformat() for day in self.recent_dates],
+            "ma_sums": {str(window): total for window, total in self.ma_sums.items()},
+            "zscore_stats": self.zscore_stats,
+            "vol_stats": self.vol_stats,
+            "nonpositive": self.nonpositive,
+            "updates_since_rebase": self.updates_since_rebase,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict):
+        state = cls()
+        state.count = data["count"]
+        state.peak = data["peak"]
+        state.last_date = date.fromisoformat(data["last_date"]) if data["last_date"] else None
+        state.values.extend(data["values"])
+        state.recent_dates.extend(date.fromisoformat(day) for day in data["recent_dates"])
+        state.ma_sums = {int(window): total for window, total in data["ma_sums"].items()}
+        state.zscore_stats = list(data["zscore_stats"])
+        state.vol_stats = list(data["vol_stats"])
+        state.nonpositive = data["nonpositive"]
+        state.updates_since_rebase = data["updates_since_rebase"]
+        return state
+
+
+def load_rolling_states(db) -> dict[str, RollingAssetState]:
+    """Persisted states for the current CALCULATION_VERSION, keyed by asset."""
+    rows = db.execute(
+        select(MetricRollingState.asset, MetricRollingState.state)
+        .where(MetricRollingState.calculation_version == CALCULATION_VERSION)
+    ).all()
+    return {row.asset: RollingAssetState.from_json(row.state) for row in rows}
+
+
+def save_rolling_states(db, states: dict[str, RollingAssetState]) -> None:
+    """Upsert states without committing; the caller commits with the metrics."""
+    timestamp = _utc_now_naive()
+    rows = [
+        {
+            "asset": asset,
+            "last_date": state.last_date,
+            "state": state.to_json(),
+            "calculation_version": CALCULATION_VERSION,
+            "updated_at": timestamp,
+        }
+        for asset, state in states.items()
+    ]
+    bulk_upsert(db, MetricRollingState, rows, ["asset"])
+
+
+def _asset_history(db, field):
+    column = getattr(MarketData, field)
+    return db.execute(select(MarketData.date, column).order_by(MarketData.date)).all()
+
+
+def _latest_crypto_rows(db):
+    rows = []
+    for symbol in ("BTC", "ETH"):
+        row = db.execute(
+            select(CryptoQuote.symbol, CryptoQuote.price, CryptoQuote.timestamp)
+            .where(CryptoQuote.symbol == symbol, CryptoQuote.price.is_not(None))
+            .order_by(CryptoQuote.timestamp.desc())
+            .limit(1)
+        ).first()
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def _latest_market_crypto_row(db):
+    row = db.execute(
+        select(MarketData.date, MarketData.bitcoin, MarketData.ethereum)
+        .where(MarketData.bitcoin.is_not(None), MarketData.ethereum.is_not(None))
+        .order_by(MarketData.date.desc())
+        .limit(1)
+    ).first()
+    return [row] if row is not None else []
+
+
+def _recent_macro_rows(db):
+    latest = db.execute(select(func.max(MacroData.date))).scalar()
+    if latest is None:
+        return []
+    return _select_rows(
+        db,
+        MacroData,
+        MacroData.date >= latest - timedelta(days=MACRO_LOOKBACK_DAYS),
+        order_by=MacroData.date,
+    )
+
+
+def calculate_metrics_incremental(db, states=None, skip_unchanged=True) -> tuple[list[dict], int, dict, dict]:
+    """
+    Update rolling states with bars newer than each state's last date and emit metrics.
+
+    Assets without a stored state (or whose recent stored bars no longer
+    match the database) are rebuilt from their full history once. With
+    skip_unchanged, only metrics whose input hash changed are emitted.
+    Returns (metrics, rows_inspected, states, hashes of the emitted
+    metrics); the caller persists states and hashes.
+    """
+    if states is None:
+        states = load_rolling_states(db)
+
+    known = [state for state in states.values() if state.recent_dates]
+    window_start = min(state.recent_dates[0] for state in known) if known else None
+    recent_rows = []
+    if window_start is not None:
+        recent_rows = _select_rows(db, MarketData, MarketData.date >= window_start, order_by=MarketData.date)
+    rows_inspected = len(recent_rows)
+
+    for metric_name, field in MARKET_ASSETS.items():
+        observations = [
+            (row.date, float(getattr(row, field)))
+            for row in recent_rows
+            if _is_valid_number(getattr(row, field))
+        ]
+        state = states.get(metric_name)
+
+        if state is not None and state.count and not state.matches(observations):
+            print(f"Rebuilding rolling state for {metric_name}: stored bars were revised")
+            state = None
+
+        if state is None or state.count == 0:
+            history = _asset_history(db, field)
+            rows_inspected += len(history)
+            state = RollingAssetState.from_history(history)
+        else:
+            for day, value in observations:
+                if state.last_date is None or day > state.last_date:
+                    state.push(day, value)
+
+        states[metric_name] = state
+
+    macro_rows = _recent_macro_rows(db)
+    crypto_rows = _latest_crypto_rows(db)
+    market_crypto_rows = _latest_market_crypto_row(db)
+    rows_inspected += len(macro_rows) + len(crypto_rows) + len(market_crypto_rows)
+
+    digests = {f"market_data.{field}": states[name].fingerprint() for name, field in MARKET_ASSETS.items()}
+    digests["market_data.usd_index:last2"] = digest(states["usd_index"].recent_observations()[-2:])
+    digests.update(macro_input_digests(macro_rows))
+    digests.update(crypto_input_digests(crypto_rows, market_crypto_rows))
+    hashes = metric_hashes(digests)
+    changed = select_changed_metrics(db, hashes, skip_unchanged)
+    groups = groups_for(changed)
+
+    metrics = []
+    if "macro" in groups:
+        _calculate_macro_metrics(metrics, macro_rows)
+
+    usd_index = states["usd_index"]
+    if "dxy" in groups:
+        if usd_index.count < 2:
+            print("Skipped metric dxy_1d_return: fewer than two USD_Index observations")
+        else:
+            _add_metric(
+                metrics,
+                _metric(
+                    "dxy_1d_return",
+                    usd_index.last_date,
+                    _safe_ratio_return(usd_index.values[-1], usd_index.values[-2]),
+                ),
+            )
+
+    if "btc_eth" in groups:
+        _calculate_btc_eth_ratio(metrics, market_crypto_rows, crypto_rows)
+
+    for metric_name in MARKET_ASSETS:
+        if metric_name in groups:
+            states[metric_name].emit(metrics, metric_name)
+
+    metrics = [metric for metric in metrics if metric["metric_name"] in changed]
+    return metrics, rows_inspected, states, {name: hashes[name] for name in changed}
@@ -0,0 +1,84 @@
+"""JSON encoding for API payloads: non-finite floats become null."""
+
+import json
+import math
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ModuleNotFoundError:  # optional: falls back to the standard json module
+    orjson = None
+
+
+def finite_list(values) -> list:
+    """
+    Floats of an array or Series as a list, with NaN/inf replaced by None.
+
+    Cleans at the array level, so producers of long float lists (sparklines,
+    rolling series) hand sanitize() and the encoder nothing left to fix.
+    """
+    arr = np.asarray(values, dtype=float)
+    mask = ~np.isfinite(arr)
+    if not mask.any():
+        return arr.tolist()
+    out = arr.astype(object)
+    out[mask] = None
+    return out.tolist()
+
+
+def sanitize(obj):
+    """
+    Copy of a nested payload with NaN/inf as None, NumPy and pandas values as
+    Python ones, and dates/timestamps as ISO strings.
+    """
+    if isinstance(obj, dict):
+        return {k: sanitize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [sanitize(v) for v in obj]
+    if isinstance(obj, float):
+        # Also np.float64, which subclasses float.
+        return float(obj) if math.isfinite(obj) else None
+    if isinstance(obj, (np.ndarray, pd.Series)):
+        if obj.dtype.kind == "f":
+            return finite_list(obj)
+        return sanitize(obj.tolist())
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, date):
+        # Also datetime and pd.Timestamp.
+        return obj.isoformat()
+    if isinstance(obj, np.floating):
+        return sanitize(float(obj))
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _orjson_default(obj):
+    # Values orjson cannot encode natively (pandas objects, non-contiguous
+    # arrays) go through sanitize(), so both encoders accept the same payloads.
+    value = sanitize(obj)
+    if value is obj:
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+    return value
+
+
+def dumps(obj) -> bytes:
+    """
+    Compact UTF-8 JSON for obj.
+
+    With orjson installed, NumPy arrays and scalars are encoded natively and
+    NaN/inf are written as null without walking the payload first; anything
+    else is handed to sanitize(). Without orjson the payload is sanitized and
+    encoded with json. Both produce the same document.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            default=_orjson_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(sanitize(obj), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,134 @@
+"""Request coalescing: concurrent callers with the same key share one computation."""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ModuleNotFoundError:  # non-POSIX: coalescing stays within one process
+    fcntl = None
+
+from services.history_cache import CACHE_DIR
+
+
+LOCK_DIR = os.getenv("SINGLE_FLIGHT_LOCK_DIR", os.path.join(CACHE_DIR, "locks"))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls: dict[str, _Call] = {}
+_calls_lock = threading.Lock()
+
+
+def _lock_path(key: str, suffix: str) -> str:
+    return os.path.join(LOCK_DIR, hashlib.sha256(key.encode()).hexdigest()[:32] + suffix)
+
+
+def _read_shared_result(key: str) -> tuple[int, object] | None:
+    """(stamp, result) of the last cross-process computation for key, or None."""
+    try:
+        with open(_lock_path(key, ".result.json")) as handle:
+            stored = json.load(handle)
+        return stored["stamp"], stored["result"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_shared_result(key: str, result) -> None:
+    """Publish result for workers queued on the lock; atomic, failures only logged."""
+    try:
+        body = json.dumps({"stamp": time.time_ns(), "result": result}, default=str)
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=LOCK_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w") as handle:
+            handle.write(body)
+        os.replace(tmp_path, _lock_path(key, ".result.json"))
+    except (OSError, TypeError, ValueError) as exc:
+        print(f"Could not share single-flight result for {key}: {exc}")
+
+
+def _run_cross_process(key: str, fn):
+    # Stamp of the newest shared result before queueing: anything newer was
+    # computed while this caller waited, so it is returned instead of rerun.
+    seen = _read_shared_result(key)
+    seen_stamp = seen[0] if seen is not None else 0
+
+    with file_lock(key):
+        shared = _read_shared_result(key)
+        if shared is not None and shared[0] > seen_stamp:
+            return shared[1]
+        result = fn()
+        _write_shared_result(key, result)
+    return result
+
+
+@contextlib.contextmanager
+def file_lock(key: str):
+    """
+    Exclusive advisory lock shared by every process on this host.
+
+    Uvicorn workers are separate processes, so in-process coalescing alone
+    would still let each worker run the computation once.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(_lock_path(key, ".lock"), "a+") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def single_flight(key: str, fn, cross_process: bool = False):
+    """
+    Run fn() once for all concurrent callers using the same key.
+
+    The first caller computes; callers arriving while it runs wait and get
+    the same result (or exception). With cross_process=True the computation
+    also holds a file lock for the key, so workers queue behind each other,
+    and the result is written next to the lock as JSON: a worker that was
+    queued while another one finished returns that result instead of
+    calling fn. Results must then be JSON-serializable (values json cannot
+    encode are stored as strings). Failures are not shared; the next worker
+    in the queue retries.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        if cross_process:
+            call.result = _run_cross_process(key, fn)
+        else:
+            call.result = fn()
+    except BaseException as exc:
+        call.error = exc
+        raise
+    finally:
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.done.set()
+
+    return call.result
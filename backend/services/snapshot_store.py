@@ -0,0 +1,107 @@
+"""Pre-encoded overview snapshots persisted per data version."""
+
+import gzip
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, select
+
+from db import SessionLocal
+from models import OverviewSnapshot
+from services.serialization import dumps
+
+
+# Older versions are only useful to workers still serving them; keep a few.
+SNAPSHOTS_KEPT = int(os.getenv("OVERVIEW_SNAPSHOTS_KEPT", "5"))
+
+
+@dataclass(frozen=True)
+class EncodedSnapshot:
+    # None for a payload that must not be reused (e.g. a degraded build).
+    data_version: int | None
+    etag: str
+    body: bytes
+    body_gzip: bytes
+    built_at: float
+
+
+def encode_snapshot(payload: dict, data_version: int | None, built_at: float) -> EncodedSnapshot:
+    """
+    Encode payload once as compact JSON plus its gzip form; NaN/inf become null.
+
+    The ETag is a hash of the JSON body. It is weak because the gzip and
+    identity bodies share it.
+    """
+    body = dumps(payload)
+    return EncodedSnapshot(
+        data_version=data_version,
+        etag=f'W/"{hashlib.sha256(body).hexdigest()[:32]}"',
+        body=body,
+        body_gzip=gzip.compress(body, compresslevel=6, mtime=0),
+        built_at=built_at,
+    )
+
+
+def _from_row(row: OverviewSnapshot) -> EncodedSnapshot:
+    return EncodedSnapshot(
+        data_version=row.data_version,
+        etag=row.etag,
+        body=row.body,
+        body_gzip=row.body_gzip,
+        built_at=row.created_at.replace(tzinfo=timezone.utc).timestamp(),
+    )
+
+
+def load_snapshot(data_version: int, db=None) -> EncodedSnapshot | None:
+    """The stored snapshot for data_version, or None."""
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        row = db.execute(
+            select(OverviewSnapshot).where(OverviewSnapshot.data_version == data_version)
+        ).scalar_one_or_none()
+        return _from_row(row) if row is not None else None
+    finally:
+        if own_session:
+            db.close()
+
+
+def save_snapshot(snapshot: EncodedSnapshot, db=None) -> None:
+    """Store snapshot under its data version and drop all but the newest SNAPSHOTS_KEPT."""
+    if snapshot.data_version is None:
+        raise ValueError("Only versioned snapshots can be stored")
+
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+
+    try:
+        row = db.execute(
+            select(OverviewSnapshot).where(OverviewSnapshot.data_version == snapshot.data_version)
+        ).scalar_one_or_none()
+        if row is None:
+            row = OverviewSnapshot(data_version=snapshot.data_version)
+            db.add(row)
+        row.etag = snapshot.etag
+        row.body = snapshot.body
+        row.body_gzip = snapshot.body_gzip
+        row.created_at = datetime.fromtimestamp(snapshot.built_at, timezone.utc).replace(tzinfo=None)
+        db.flush()
+
+        kept = (
+            select(OverviewSnapshot.id)
+            .order_by(OverviewSnapshot.data_version.desc())
+            .limit(SNAPSHOTS_KEPT)
+        )
+        db.execute(delete(OverviewSnapshot).where(OverviewSnapshot.id.not_in(kept)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
@@ -0,0 +1,98 @@
+"""Small dependency-aware executor for running independent steps concurrently."""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+
+@dataclass
+class TaskResult:
+    name: str
+    status: str  # "success", "failed" or "skipped"
+    value: Any = None
+    error: str | None = None
+    seconds: float = 0.0
+
+
+def _validate(tasks: dict) -> None:
+    for name, (_, deps) in tasks.items():
+        unknown = [dep for dep in deps if dep not in tasks]
+        if unknown:
+            raise ValueError(f"Task '{name}' depends on unknown tasks: {', '.join(unknown)}")
+
+    # Kahn's algorithm: every task must become ready eventually.
+    remaining = {name: set(deps) for name, (_, deps) in tasks.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle among tasks: {', '.join(sorted(remaining))}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def _timed_call(fn: Callable[[], Any]) -> tuple[Any, float]:
+    started = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - started
+
+
+def run_task_graph(
+    tasks: Iterable[tuple[str, Callable[[], Any], Iterable[str]]],
+    max_workers: int | None = None,
+) -> dict[str, TaskResult]:
+    """
+    Run (name, fn, dependencies) tasks on a thread pool.
+
+    A task starts as soon as all of its dependencies have succeeded. If any
+    dependency fails or is skipped, the task is skipped. Failures never
+    raise here; callers inspect the returned results, which keep the order
+    the tasks were given in.
+    """
+    graph = {name: (fn, tuple(deps)) for name, fn, deps in tasks}
+    _validate(graph)
+
+    results: dict[str, TaskResult] = {}
+    pending = dict(graph)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(graph), 1)) as executor:
+        while pending or running:
+            for name in list(pending):
+                fn, deps = pending[name]
+                if not all(dep in results for dep in deps):
+                    continue
+
+                del pending[name]
+                blocked = [dep for dep in deps if results[dep].status != "success"]
+                if blocked:
+                    results[name] = TaskResult(
+                        name=name,
+                        status="skipped",
+                        error=f"Upstream task did not succeed: {', '.join(blocked)}",
+                    )
+                    continue
+
+                running[executor.submit(_timed_call, fn)] = (name, time.perf_counter())
+
+            if not running:
+                # Everything left was skipped in this pass; loop to resolve dependents.
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                try:
+                    value, seconds = future.result()
+                    results[name] = TaskResult(name=name, status="success", value=value, seconds=seconds)
+                except Exception as exc:
+                    results[name] = TaskResult(
+                        name=name,
+                        status="failed",
+                        error=str(exc),
+                        seconds=time.perf_counter() - started,
+                    )
+
+    return {name: results[name] for name in graph}
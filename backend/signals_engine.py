@@ -2,17 +2,29 @@ import pandas as pd
 from sqlalchemy.orm import Session
 from db import SessionLocal
 from models import MarketData
+from services.data_version import frame_key, memoize_on_data_version
+from services.history_cache import load_cached_history
 
 # ---------------------------------------------------------------------
 # STEP 1: Load market data from DB
 # ---------------------------------------------------------------------
-def load_market_data():
-    """Fetches market data as a pandas DataFrame."""
+def load_market_data(columns=None, bind=None):
+    """
+    Fetches market data as a pandas DataFrame.
+
+    Reads the memory-mapped history cache when it matches the database and
+    falls back to the database (rewriting the cache) otherwise. columns
+    limits the frame to those columns; bind reuses a caller's connection
+    instead of opening a session.
+    """
+    if bind is not None:
+        return load_cached_history("market_data", bind, columns)
+
     db: Session = SessionLocal()
-    data = pd.read_sql("SELECT * FROM market_data ORDER BY date", db.bind)
-    db.close()
-    data["date"] = pd.to_datetime(data["date"])
-    data.set_index("date", inplace=True)
+    try:
+        data = load_cached_history("market_data", db.connection(), columns)
+    finally:
+        db.close()
     return data
 
 
@@ -72,9 +84,14 @@ STATIC_WEIGHTS = {
 # ---------------------------------------------------------------------
 # STEP 3: Compute normalized returns
 # ---------------------------------------------------------------------
-def compute_normalized_returns(df: pd.DataFrame):
-    """Computes daily % returns and z-score normalization per column."""
-    returns = df.pct_change().dropna()
+def compute_normalized_returns(df: pd.DataFrame, returns: pd.DataFrame = None):
+    """Computes daily % returns and z-score normalization per column.
+
+    returns, when given, are df's precomputed daily % returns.
+    """
+    if returns is None:
+        returns = df.pct_change()
+    returns = returns.dropna()
     zscores = (returns - returns.mean()) / returns.std()
     return zscores
 
@@ -117,9 +134,17 @@ def compute_sentiment_index(group_scores: pd.DataFrame, weights=None):
 # ---------------------------------------------------------------------
 # STEP 6: Main function
 # ---------------------------------------------------------------------
-def generate_sentiment_series():
-    df = load_market_data()
-    zscores = compute_normalized_returns(df)
+@memoize_on_data_version(key=lambda df=None, returns=None: frame_key(df))
+def generate_sentiment_series(df=None, returns=None):
+    """
+    Sentiment index and group scores; cached until the data version changes.
+
+    df (and its daily returns) can be passed in by callers that already
+    loaded market data, otherwise it is loaded here.
+    """
+    if df is None:
+        df = load_market_data()
+    zscores = compute_normalized_returns(df, returns)
     group_scores = compute_group_scores(zscores)
     sentiment = compute_sentiment_index(group_scores)
     return sentiment, group_scores
@@ -0,0 +1,42 @@
+import os
+from datetime import date
+
+import pytest
+
+from models import MacroData
+from services import history_cache
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_cache, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_rows_written_outside_ingestion_rebuild_the_cache(db, cache_dir):
+    db.add(MacroData(date=date(2025, 6, 30), cpi=320.0))
+    db.commit()
+
+    first = history_cache.load_cached_history("macro_data", db.connection(), ["cpi"])
+    assert first["cpi"].tolist() == [320.0]
+    assert os.stat(history_cache.cache_path("macro_data")).st_mode & 0o777 == 0o644
+
+    db.add(MacroData(date=date(2025, 7, 31), cpi=321.5))
+    db.commit()
+
+    second = history_cache.load_cached_history("macro_data", db.connection(), ["cpi"])
+    assert second["cpi"].tolist() == [320.0, 321.5]
+
+
+def test_unstamped_file_is_a_miss(db, cache_dir):
+    db.add(MacroData(date=date(2025, 6, 30), cpi=320.0))
+    db.commit()
+    frame = history_cache.load_history_frame("macro_data", db.connection())
+    history_cache.write_history_cache("macro_data", frame)
+
+    stamp = history_cache.history_stamp("macro_data", db.connection())
+
+    assert history_cache.read_history_cache("macro_data", stamp=stamp) is None
+    assert history_cache.read_history_cache("macro_data") is not None
@@ -0,0 +1,30 @@
+from datetime import date, datetime
+
+from models import CalculatedMetric
+from services.metric_loader import load_metric_history
+
+
+def _add(db, timestamp, value):
+    db.add(CalculatedMetric(metric_name="spx_return_5d", timestamp=timestamp, value=value))
+
+
+def test_single_day_range_includes_the_whole_day(db):
+    _add(db, datetime(2025, 7, 18), 0.5)
+    _add(db, datetime(2025, 7, 21), 1.0)
+    _add(db, datetime(2025, 7, 21, 16, 30), 2.0)
+    _add(db, datetime(2025, 7, 22), 3.0)
+    db.commit()
+
+    rows = load_metric_history(db, "spx_return_5d", start=date(2025, 7, 21), end=date(2025, 7, 21))
+
+    assert [row["value"] for row in rows] == [1.0, 2.0]
+
+
+def test_datetime_end_is_inclusive_as_given(db):
+    _add(db, datetime(2025, 7, 21), 1.0)
+    _add(db, datetime(2025, 7, 21, 16, 30), 2.0)
+    db.commit()
+
+    rows = load_metric_history(db, "spx_return_5d", end=datetime(2025, 7, 21))
+
+    assert [row["value"] for row in rows] == [1.0]
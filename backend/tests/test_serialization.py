@@ -0,0 +1,52 @@
+import json
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import serialization
+
+
+def _payload():
+    matrix = np.arange(12, dtype=float).reshape(4, 3)
+    matrix[1, 1] = np.nan
+    return {
+        "series": pd.Series([1.5, np.nan, np.inf]),
+        "int_series": pd.Series([1, 2, 3]),
+        "column": matrix[:, 1],
+        "array": np.array([0.25, -np.inf]),
+        "timestamp": pd.Timestamp("2025-07-21 16:30"),
+        "missing_timestamp": pd.NaT,
+        "dates": [date(2025, 7, 21), datetime(2025, 7, 21, 9, 15)],
+        "scalars": {"f": np.float64(np.nan), "i": np.int64(7), "b": np.bool_(True)},
+        "nested": [{"value": 1.0, "change": float("inf")}, ("a", None)],
+        1: "non-string key",
+    }
+
+
+def _dumps_without_orjson(monkeypatch, payload):
+    monkeypatch.setattr(serialization, "orjson", None)
+    return serialization.dumps(payload)
+
+
+def test_orjson_and_json_backends_agree(monkeypatch):
+    pytest.importorskip("orjson")
+    payload = _payload()
+
+    with_orjson = json.loads(serialization.dumps(payload))
+    without_orjson = json.loads(_dumps_without_orjson(monkeypatch, payload))
+
+    assert with_orjson == without_orjson
+    assert with_orjson["series"] == [1.5, None, None]
+    assert with_orjson["column"] == [1.0, None, 7.0, 10.0]
+    assert with_orjson["timestamp"] == "2025-07-21T16:30:00"
+    assert with_orjson["missing_timestamp"] is None
+
+
+def test_json_backend_encodes_pandas_values(monkeypatch):
+    decoded = json.loads(_dumps_without_orjson(monkeypatch, _payload()))
+
+    assert decoded["int_series"] == [1, 2, 3]
+    assert decoded["scalars"] == {"f": None, "i": 7, "b": True}
+    assert decoded["dates"] == ["2025-07-21", "2025-07-21T09:15:00"]
@@ -16,7 +16,7 @@ export default function MacroChips({ macro }) {
             <tr key={label} style={{ borderBottom: "1px solid var(--panel-border)" }}>
               <td style={{ padding: "0.5rem 0", color: "var(--text-mute)", width: "80px" }}>{label}</td>
               <td style={{ padding: "0.5rem 0", textAlign: "right", fontWeight: 600, fontVariantNumeric: "tabular-nums", fontSize: "1rem" }}>
-                {value.toFixed(2)}
+                {value != null ? value.toFixed(2) : "—"}
               </td>
               <td style={{ padding: "0.5rem 0", textAlign: "right", width: "35px", color: arrowColor(dir), fontWeight: 700, fontSize: "0.9rem" }}>
                 {arrow(dir)}
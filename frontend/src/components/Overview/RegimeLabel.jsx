@@ -26,7 +26,7 @@ function SignalBlock({ title, children }) {
 }
 
 export default function RegimeLabel({ regime }) {
-  if (!regime) return null;
+  if (!regime?.regime) return null;
 
   const accent = REGIME_ACCENT[regime.regime] || "var(--cyan)";
   const { vix, dispersion, correlations } = regime.signals || {};
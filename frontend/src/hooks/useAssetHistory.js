@@ -1,9 +1,10 @@
 import { useEffect, useState } from "react";
 import axios from "axios";
 
-// Fetches /api/history and returns price series for a given symbol
-// History API returns: [{ date, sp500, nasdaq, gold, ... }, ...]
-let cachedHistory = null;
+// Fetches one symbol's series from /api/history/{symbol}, downsampled on the server
+// API returns: { symbol, total, date: [...], price: [...] }
+const CHART_POINTS = 500;
+const cachedSeries = new Map();
 
 export default function useAssetHistory(symbol) {
   const [data, setData] = useState(null);
@@ -12,35 +13,40 @@ export default function useAssetHistory(symbol) {
   useEffect(() => {
     if (!symbol) return;
 
-    setLoading(true);
-
-    const resolve = (hist) => {
-      if (!hist || !Array.isArray(hist)) {
-        setData(null);
-        setLoading(false);
-        return;
-      }
-      const series = hist
-        .filter((row) => row[symbol] != null)
-        .map((row) => ({ date: row.date, price: row[symbol] }));
-      setData(series);
+    if (cachedSeries.has(symbol)) {
+      setData(cachedSeries.get(symbol));
       setLoading(false);
-    };
-
-    if (cachedHistory) {
-      resolve(cachedHistory);
-    } else {
-      axios
-        .get("/api/history")
-        .then((res) => {
-          cachedHistory = res.data;
-          resolve(cachedHistory);
-        })
-        .catch(() => {
-          setData(null);
-          setLoading(false);
-        });
+      return;
     }
+
+    // Aborted when the symbol changes or the component unmounts, so a slow
+    // response for a previous symbol never replaces the current one.
+    const controller = new AbortController();
+    setData(null);
+    setLoading(true);
+
+    axios
+      .get(`/api/history/${encodeURIComponent(symbol)}`, {
+        params: { points: CHART_POINTS },
+        signal: controller.signal,
+      })
+      .then((res) => {
+        const { date, price } = res.data;
+        const series = date.map((d, i) => ({ date: d, price: price[i] }));
+        cachedSeries.set(symbol, series);
+        setData(series);
+      })
+      .catch((err) => {
+        if (axios.isCancel(err)) return;
+        // Rows without stored history (e.g. dgs2, dgs10, slope_2s10s) 404;
+        // they chart as an empty series, as before.
+        setData(err.response?.status === 404 ? [] : null);
+      })
+      .finally(() => {
+        if (!controller.signal.aborted) setLoading(false);
+      });
+
+    return () => controller.abort();
   }, [symbol]);
 
   return { data, loading };
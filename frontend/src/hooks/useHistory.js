@@ -1,17 +1,43 @@
 import { useEffect, useState } from "react";
 import axios from "axios";
 
-export default function useHistory() {
+// Columnar response: { columns: { date: [...], sp500: [...], ... }, next_cursor }
+// Rebuilt here into the row shape pages use: [{ date, sp500, ... }, ...]
+function columnsToRows(columns) {
+  const names = Object.keys(columns);
+  return columns.date.map((_, i) => {
+    const row = {};
+    for (const name of names) row[name] = columns[name][i];
+    return row;
+  });
+}
+
+// Fetches only what a chart draws: symbols narrows the columns, start/end
+// the date window and limit the row count (all of them by default).
+export default function useHistory({ symbols, start, end, limit } = {}) {
   const [history, setHistory] = useState(null);
   const [loading, setLoading] = useState(true);
+  const symbolList = symbols?.join(",");
 
   useEffect(() => {
+    const controller = new AbortController();
+    setLoading(true);
+
     axios
-      .get("/api/history")
-      .then((res) => setHistory(res.data))
-      .catch((err) => console.error("Failed to fetch history:", err))
-      .finally(() => setLoading(false));
-  }, []);
+      .get("/api/history", {
+        params: { format: "columns", symbols: symbolList, start, end, limit },
+        signal: controller.signal,
+      })
+      .then((res) => setHistory(columnsToRows(res.data.columns)))
+      .catch((err) => {
+        if (!axios.isCancel(err)) console.error("Failed to fetch history:", err);
+      })
+      .finally(() => {
+        if (!controller.signal.aborted) setLoading(false);
+      });
+
+    return () => controller.abort();
+  }, [symbolList, start, end, limit]);
 
   return { history, loading };
 }
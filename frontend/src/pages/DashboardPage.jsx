@@ -86,7 +86,7 @@ export default function DashboardPage() {
       {/* Two-column: Regime + Top Movers */}
       <div style={{ display: "grid", gridTemplateColumns: "1fr 1fr", gap: "0.5rem" }}>
         {/* Regime */}
-        {overview.regime && (
+        {overview.regime?.regime && (
           <TerminalPanel title="Macro Regime">
             <RegimeLabel regime={overview.regime} />
           </TerminalPanel>
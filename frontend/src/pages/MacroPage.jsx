@@ -58,7 +58,7 @@ export default function MacroPage() {
       </div>
 
       {/* Regime */}
-      {overview.regime && (
+      {overview.regime?.regime && (
         <div style={{ marginBottom: "0.5rem" }}>
           <TerminalPanel title="Regime Classification">
             <RegimeLabel regime={overview.regime} />
@@ -45,7 +45,7 @@ export default function OverviewPage() {
       >
         <h2 style={{ margin: 0, color: "#4cc9f0" }}>
           Sentiment: {data.sentiment.label} (Score:{" "}
-          {data.sentiment.score.toFixed(2)})
+          {data.sentiment.score?.toFixed(2) ?? "—"})
         </h2>
 
         <p style={{ margin: "0.5rem 0 0 0", opacity: 0.8 }}>
@@ -58,7 +58,7 @@ export default function OverviewPage() {
       </div>
 
       {/* REGIME LABEL */}
-      {data.regime && (
+      {data.regime?.regime && (
         <div style={{ marginBottom: "1.5rem" }}>
           <h2 style={{ color: "var(--blue)", marginBottom: "0.3rem" }}>Macro Regime</h2>
           <p style={{ color: "var(--text-mute)", fontSize: "0.82rem", marginBottom: "0.8rem", margin: "0 0 0.8rem 0" }}>
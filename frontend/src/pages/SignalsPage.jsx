@@ -1,10 +1,20 @@
 import { useState } from "react";
 import { useMarketData } from "../context/MarketDataContext";
 import useHistory from "../hooks/useHistory";
+import useAssetHistory from "../hooks/useAssetHistory";
 import TerminalLoader from "../components/Terminal/TerminalLoader";
 import TerminalPanel from "../components/Terminal/TerminalPanel";
 import { AreaChart, Area, LineChart, Line, XAxis, YAxis, ResponsiveContainer, Tooltip, CartesianGrid } from "recharts";
 
+const OVERLAY_SYMBOLS = ["sp500", "vix", "gold"];
+const OVERLAY_DAYS = 365;
+
+function daysAgo(days) {
+  const d = new Date();
+  d.setDate(d.getDate() - days);
+  return d.toISOString().slice(0, 10);
+}
+
 function ChartTooltip({ active, payload, label }) {
   if (!active || !payload?.length) return null;
   return (
@@ -27,29 +37,25 @@ function ChartTooltip({ active, payload, label }) {
 
 export default function SignalsPage() {
   const { overview } = useMarketData();
-  const { history, loading } = useHistory();
+  // One row is enough to list the available columns for the selector
+  const { history: firstRow, loading } = useHistory({ limit: 1 });
   const [selectedAsset, setSelectedAsset] = useState("sp500");
+  // Selected asset: one column, downsampled on the server
+  const { data: priceData } = useAssetHistory(selectedAsset);
+  // Multi-asset overlay: three columns over the last year only
+  const { history: overlayHistory } = useHistory({
+    symbols: OVERLAY_SYMBOLS,
+    start: daysAgo(OVERLAY_DAYS),
+  });
 
   if (loading) return <TerminalLoader message="LOADING HISTORY" />;
 
-  // History API returns: [{ date, sp500, nasdaq, gold, oil, ... }, ...]
-  const rows = Array.isArray(history) ? history : [];
-
-  const availableAssets = rows.length > 0
-    ? Object.keys(rows[0]).filter((k) => k !== "date" && k !== "id")
+  const availableAssets = firstRow?.length > 0
+    ? Object.keys(firstRow[0]).filter((k) => k !== "date" && k !== "id")
     : [];
 
-  const priceData = rows
-    .filter((row) => row[selectedAsset] != null)
-    .map((row) => ({ date: row.date, price: row[selectedAsset] }));
-
-  // Multi-asset overlay
-  const overlayData = rows.map((row) => ({
-    date: row.date,
-    sp500: row.sp500,
-    vix: row.vix,
-    gold: row.gold,
-  }));
+  // History API returns: [{ date, sp500, vix, gold }, ...]
+  const overlayData = Array.isArray(overlayHistory) ? overlayHistory : [];
 
   return (
     <div>
@@ -99,7 +105,7 @@ export default function SignalsPage() {
         }
         style={{ marginBottom: "0.5rem" }}
       >
-        {priceData.length > 0 ? (
+        {priceData == null ? null : priceData.length > 0 ? (
           <div style={{ height: 340 }}>
             <ResponsiveContainer>
               <AreaChart data={priceData} margin={{ top: 10, right: 10, bottom: 5, left: 10 }}>
@@ -141,7 +147,7 @@ export default function SignalsPage() {
 
       {/* Multi-asset comparison */}
       {overlayData.length > 0 && overlayData.some((d) => d.sp500 != null) && (
-        <TerminalPanel title="Multi-Asset Overlay (SP500 / VIX / Gold)">
+        <TerminalPanel title="Multi-Asset Overlay (SP500 / VIX / Gold, 1Y)">
           <div style={{ height: 280 }}>
             <ResponsiveContainer>
               <LineChart data={overlayData} margin={{ top: 10, right: 10, bottom: 5, left: 10 }}>